@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+"""Benchmarks the encoding of fsynth.py on problem files and writes machine-readable results as JSON.
+Every run solves one problem in its own process, which allows to measure its peak memory and to kill it on timeout.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shlex
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from statistics import median, stdev
+
+import yaml
+
+# z3 statistics that are reported for every problem, all of them are kept under 'z3'
+Z3_KEYS = ['conflicts', 'decisions', 'memory', 'max memory']
+
+
+def run_one(filename: Path, options: str):
+    """
+    Solves the problem with the plain encoding of fsynth.py and prints the result, the size of the encoding and the
+    statistics of z3 as JSON
+    """
+    import fsynth
+    import z3
+
+    with filename.open() as fp:
+        spec = yaml.safe_load(fp)
+    ns = fsynth.cli_parser.parse_args(shlex.split(options))
+
+    s = z3.Solver()
+    encoder = fsynth.NetworkEncoder(s, spec['inputs'], spec['outputs'], int(spec['depth']), int(spec['width']),
+                                    **fsynth.encoding_options(ns))
+    for sample in spec['samples']:
+        encoder.add_sample(sample)
+    size = encoder.statistics()
+    ans = s.check()
+    st = s.statistics()
+
+    json.dump({'result': str(ans), 'assertions': size['assertions'], 'variables': size['variables'],
+               'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               'z3': {key: st.get_key_value(key) for key in st.keys()}}, sys.stdout)
+
+
+def measure(filename: Path, options: str, timeout: float):
+    """
+    Runs run_one in a child process
+    :return: The record of the run with wall time, peak RSS of the child (in KiB) and the output of run_one
+    """
+    cli = [sys.executable, str(Path(__file__).absolute()), "--run-one", str(filename), f"--options={options}"]
+    start = time.perf_counter()
+    process = subprocess.Popen(cli, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               start_new_session=True)
+    try:
+        out, err = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        return {'result': 'timeout', 'wall': time.perf_counter() - start}
+    wall = time.perf_counter() - start
+    if process.returncode != 0:
+        return {'result': 'error', 'wall': wall, 'error': err.strip().splitlines()[-1:]}
+    record = json.loads(out)
+    record['wall'] = wall
+    return record
+
+
+def summarize(runs):
+    """
+    Combines the records of repeated runs of one problem: median and standard deviation of the wall time,
+    the maximal peak RSS and the remaining values of the first run
+    """
+    summary = dict(runs[0])
+    walls = [run['wall'] for run in runs]
+    summary['wall'] = median(walls)
+    summary['wall_stdev'] = stdev(walls) if len(walls) > 1 else 0.0
+    summary['wall_runs'] = walls
+    summary['results'] = sorted({run['result'] for run in runs})
+    if all('peak_rss' in run for run in runs):
+        summary['peak_rss'] = max(run['peak_rss'] for run in runs)
+    for key in Z3_KEYS:
+        summary[key] = summary.get('z3', {}).get(key)
+    return summary
+
+
+def benchmark(files, ns: argparse.Namespace):
+    instances = {}
+    for filename in files:
+        runs = []
+        for _ in range(ns.repeat):
+            runs.append(measure(filename, ns.options, ns.timeout))
+            if runs[-1]['result'] == 'timeout':
+                # a repetition would time out again
+                break
+        instances[filename.name] = summary = summarize(runs)
+        print(f"{filename.name}: {summary['result']} in {summary['wall']:.2f} s "
+              f"(stdev {summary['wall_stdev']:.2f} s, {len(runs)} runs)", file=sys.stderr)
+    return {'options': ns.options, 'repeat': ns.repeat, 'timeout': ns.timeout, 'instances': instances}
+
+
+def compare(old, new, threshold: float) -> bool:
+    """
+    Prints the change of the wall time of every problem of both runs and flags the regressions: a changed result
+    or a wall time that grew by more than threshold (relative)
+    :return: Whether there is a regression
+    """
+    regression = False
+    for name in sorted(set(old['instances']) & set(new['instances'])):
+        a, b = old['instances'][name], new['instances'][name]
+        change = (b['wall'] - a['wall']) / a['wall'] if a['wall'] > 0 else 0.0
+        flags = []
+        if a['result'] != b['result']:
+            flags.append(f"result {a['result']} -> {b['result']}")
+        if change > threshold:
+            flags.append("slower")
+        regression = regression or bool(flags)
+        flagged = 'REGRESSION: ' + ', '.join(flags) if flags else ''
+        print(f"{name:30s} {a['wall']:9.2f} s {b['wall']:9.2f} s {change:+8.1%}  {flagged}")
+    return regression
+
+
+if __name__ == '__main__':
+    cli_parser = argparse.ArgumentParser("benchmark.py",
+                                         description="""Benchmarks fsynth.py on problem files and compares two runs.""")
+    cli_parser.add_argument("--options", default="", metavar="OPTIONS",
+                            help="options of fsynth.py that select the encoding, e.g. '--wires implies'")
+    cli_parser.add_argument("--repeat", type=int, default=1, metavar="INT", help="runs per problem")
+    cli_parser.add_argument("--timeout", type=float, metavar="SECONDS", help="kills a run after the given seconds")
+    cli_parser.add_argument("-o", "--output", metavar="FILE", help="writes the results as JSON. Omitting: stdout")
+    cli_parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                            help="compares two JSON results instead of running the benchmark")
+    cli_parser.add_argument("--threshold", type=float, default=0.2, metavar="FLOAT",
+                            help="relative slowdown that counts as regression (default: 0.2)")
+    cli_parser.add_argument("--run-one", metavar="FILENAME", help=argparse.SUPPRESS)
+    cli_parser.add_argument("files", nargs="*", help="YAML files. Omitting: problems/*.yaml", metavar="FILENAME")
+
+    ns = cli_parser.parse_args()
+
+    if ns.run_one:
+        run_one(Path(ns.run_one), ns.options)
+        sys.exit(0)
+
+    if ns.compare:
+        runs = []
+        for name in ns.compare:
+            with open(name) as fp:
+                runs.append(json.load(fp))
+        sys.exit(1 if compare(*runs, ns.threshold) else 0)
+
+    files = [Path(f) for f in ns.files] or sorted((Path(__file__).parent / "problems").glob("*.yaml"))
+    results = benchmark(files, ns)
+    if ns.output:
+        with open(ns.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
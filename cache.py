@@ -0,0 +1,168 @@
+"""On-disk cache of synthesis results, keyed by the content of the specification and the network size.
+Realizability is monotone in the size: a network of size (d, w) also realizes every larger size (padded with id
+nodes), and if no network of size (d, w) exists, there is none of a smaller size. So one stored result can answer
+the sizes around it as well.
+The key includes a version of the code that computes the results, so a changed encoder never reads the results of
+the old one, and a stored network is only returned if it computes the samples.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:
+    # not on POSIX: concurrent runs may lose each other's records
+    fcntl = None
+
+from printer import NetworkPrinter, NetworkNode
+
+DEFAULT_DIRECTORY = Path(os.environ.get('FSYNTH_CACHE', Path.home() / '.cache' / 'fsynth'))
+
+
+def problem_key(spec: Dict, version: str = '') -> str:
+    """
+    Canonical hash of the inputs, outputs and samples, independent of the order of the keys and samples
+    :param version: The version of the code that computes the results
+    """
+    samples = sorted(json.dumps(sample, sort_keys=True) for sample in spec['samples'])
+    canonical = json.dumps({'inputs': spec['inputs'], 'outputs': spec['outputs'], 'samples': samples,
+                            'version': version}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def source_version(paths) -> str:
+    """
+    Hash of the contents of the given source files, files that do not exist are skipped
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            digest.update(Path(path).read_bytes())
+        except OSError:
+            pass
+    return digest.hexdigest()
+
+
+def matches_samples(network: Dict, spec: Dict) -> bool:
+    """
+    Checks a stored network against the samples, a wrong or corrupt entry counts as miss
+    """
+    from evaluator import matches_samples
+    try:
+        return matches_samples(network, spec)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return False
+
+
+def pad(network: Dict, depth: int, width: int, outputs: Dict[str, str]) -> NetworkPrinter:
+    """
+    Builds the printer of a stored network for a size that is at least as large, by appending layers of id nodes
+    """
+    printer = NetworkPrinter(depth, width, outputs)
+    printer.set_realizable(True)
+    layers = network['layers']
+    for d, layer in enumerate(layers):
+        for w, node in enumerate(layer):
+            printer.set_node(d, w, NetworkNode(node['op'], node['in_0'], node['in_1']))
+    for d in range(len(layers), depth):
+        for w in range(len(layers[-1])):
+            printer.set_node(d, w, NetworkNode('id', w, w))
+    for name, index in network['emitted'].items():
+        printer.set_output(name, index)
+    return printer
+
+
+class ResultCache:
+    """
+    Stores one JSON file per specification with the results of all sizes and settings. The files are evicted in
+    least recently used order (by their modification time, which a hit updates) beyond max_entries files.
+    """
+    def __init__(self, directory: Path = None, max_entries: int = 1000, version: str = ''):
+        """
+        :param directory: Omitting: $FSYNTH_CACHE or ~/.cache/fsynth
+        :param version: The version of the code that computes the results, see source_version
+        """
+        self.directory = Path(DEFAULT_DIRECTORY if directory is None else directory)
+        self.max_entries = max_entries
+        self.version = version
+
+    def path(self, spec: Dict) -> Path:
+        return self.directory / f"{problem_key(spec, self.version)}.json"
+
+    def load(self, spec: Dict):
+        try:
+            with self.path(spec).open() as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return []
+
+    def lookup(self, spec: Dict, depth: int, width: int, settings: Dict, pad_smaller: bool = True):
+        """
+        :param settings: The options the network was synthesized with. A not realizable result answers any settings,
+                         a network only the same settings
+        :param pad_smaller: Whether a network of a smaller size may answer, not for results that have to be minimal
+        :return: The network of the given size or None if the cache cannot answer
+        """
+        records = [r for r in self.load(spec) if r['network'] is None or matches_samples(r['network'], spec)]
+        exact = next((r for r in records if (r['depth'], r['width'], r['settings']) == (depth, width, settings)), None)
+        realizable = next((r for r in records if pad_smaller and r['network'] is not None
+                           and r['settings'] == settings and r['depth'] <= depth and r['width'] <= width), None)
+        unrealizable = next((r for r in records if r['network'] is None
+                             and r['depth'] >= depth and r['width'] >= width), None)
+
+        record = exact or realizable or unrealizable
+        if record is None:
+            return None
+        try:
+            os.utime(self.path(spec))
+        except FileNotFoundError:
+            pass
+        if record['network'] is None:
+            printer = NetworkPrinter(depth, width, spec['outputs'])
+            printer.set_realizable(False)
+            return printer
+        return pad(record['network'], depth, width, spec['outputs'])
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the lock of the directory, so concurrent runs (e.g. the probes of findsize --jobs) do not lose each
+        other's records between reading and writing a file
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def store(self, spec: Dict, depth: int, width: int, settings: Dict, network: NetworkPrinter):
+        record = {'depth': depth, 'width': width, 'settings': settings,
+                  'network': network.to_dict() if network.realizable else None}
+        with self.locked():
+            records = [r for r in self.load(spec)
+                       if (r['depth'], r['width'], r['settings']) != (depth, width, settings)]
+            records.append(record)
+            # write and rename, so concurrent runs never read a partial file
+            fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(records, fp)
+            os.replace(tmp, self.path(spec))
+            self.evict()
+
+    def evict(self):
+        entries = []
+        for path in self.directory.glob('*.json'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                # evicted by a concurrent run
+                pass
+        entries.sort()
+        for mtime, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            path.unlink(missing_ok=True)
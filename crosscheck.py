@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+"""Cross-checks the fast paths of fsynth.py against the plain z3 encoding and the NumPy evaluator on random
+specifications: the enumerator, the pruning of the printer, the preanalysis and the result cache.
+Every mismatch is printed, the exit status is 1 if there was one.
+"""
+
+import argparse
+import copy
+import random
+import sys
+import tempfile
+
+import numpy as np
+
+import evaluator
+import fsynth
+from cache import ResultCache
+from enumerator import enumerate_network
+from printer import NetworkPrinter, NetworkNode
+
+
+def random_spec(rng: random.Random, max_inputs: int = 3, max_outputs: int = 2, max_samples: int = 4):
+    """
+    :return: A specification with random types and sample values, and a small random size
+    """
+    inputs = {f'i{k}': rng.choice(['int', 'int', 'bool']) for k in range(rng.randint(1, max_inputs))}
+    outputs = {f'o{k}': rng.choice(['int', 'bool']) for k in range(rng.randint(1, max_outputs))}
+    samples = [{x: (rng.randint(-4, 4) if t == 'int' else bool(rng.randint(0, 1)))
+                for x, t in {**inputs, **outputs}.items()}
+               for _ in range(rng.randint(1, max_samples))]
+    return {'inputs': inputs, 'outputs': outputs, 'samples': samples,
+            'depth': rng.randint(1, 2), 'width': rng.randint(1, 3)}
+
+
+def z3_network(spec) -> NetworkPrinter:
+    return fsynth.solve(spec['inputs'], spec['outputs'], spec['samples'], spec['depth'], spec['width'])
+
+
+def check_enumerator(rng: random.Random, count: int, budget: float) -> int:
+    """
+    Compares the realizability found by the enumerator with z3 and checks its networks on the samples
+    :param budget: Seconds per specification after which the enumeration counts as a mismatch
+    :return: The number of mismatches
+    """
+    mismatches = 0
+    for _ in range(count):
+        spec = random_spec(rng)
+        enumerated = enumerate_network(spec['inputs'], spec['outputs'], spec['samples'], spec['depth'], spec['width'],
+                                       budget)
+        solved = z3_network(spec)
+        if enumerated is None or enumerated.realizable != solved.realizable \
+                or (enumerated.realizable and not evaluator.matches_samples(enumerated.to_dict(), spec)):
+            mismatches += 1
+            print("enumerator:", spec, "enumerated:", enumerated and enumerated.realizable,
+                  "z3:", solved.realizable)
+    return mismatches
+
+
+def check_prune(rng: random.Random, count: int) -> int:
+    """
+    Prunes random int networks and compares their outputs before and after on a range of inputs
+    :return: The number of mismatches
+    """
+    ops = ['+', '-', '*', '/', 'id', 'id', 'id']
+    inputs = {'a': np.arange(-5, 5), 'b': np.arange(3, 13)}
+    mismatches = 0
+    for _ in range(count):
+        depth, width = rng.randint(1, 4), rng.randint(1, 3)
+        printer = NetworkPrinter(depth, width, {'y': 'int', 'z': 'int'})
+        printer.set_realizable(True)
+        for d in range(depth):
+            sources = list(inputs) if d == 0 else list(range(width))
+            for w in range(width):
+                printer.set_node(d, w, NetworkNode(rng.choice(ops), rng.choice(sources), rng.choice(sources)))
+        printer.set_output('y', rng.randrange(width))
+        printer.set_output('z', rng.randrange(width))
+
+        # to_dict shares the outputs of the printer
+        before = copy.deepcopy(printer.to_dict())
+        printer.prune()
+        after = printer.to_dict()
+        expected, actual = evaluator.evaluate(before, inputs), evaluator.evaluate(after, inputs)
+        if any(not np.array_equal(expected[x], actual[x]) for x in expected) or len(after['layers']) > depth:
+            mismatches += 1
+            print("prune:", before, "pruned:", after)
+    return mismatches
+
+
+def check_preanalysis(rng: random.Random, count: int) -> int:
+    """
+    Checks that the preanalysis never calls a specification not realizable for which z3 finds a network
+    :return: The number of mismatches
+    """
+    mismatches = 0
+    for _ in range(count):
+        spec = random_spec(rng)
+        reason = fsynth.unrealizable_reason(spec['inputs'], spec['outputs'], spec['samples'], spec['depth'],
+                                            spec['width'])
+        if reason is not None and z3_network(spec).realizable:
+            mismatches += 1
+            print("preanalysis:", spec, "reason:", reason)
+    return mismatches
+
+
+def check_cache(rng: random.Random, count: int) -> int:
+    """
+    Stores the results of z3 in a temporary cache and checks the answers of lookups for the same and other sizes and
+    for other settings
+    :return: The number of mismatches
+    """
+    settings = {'engine': 'smt'}
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(directory)
+        for _ in range(count):
+            spec = random_spec(rng)
+            depth, width = spec['depth'], spec['width']
+            solved = z3_network(spec)
+            cache.store(spec, depth, width, settings, solved)
+
+            errors = []
+            # a network answers larger sizes, a not realizable result smaller ones
+            other = (depth + 1, width + 1) if solved.realizable else (depth, max(width - 1, 1))
+            for d, w in [(depth, width), other]:
+                hit = cache.lookup(spec, d, w, settings)
+                if hit is None or hit.realizable != solved.realizable \
+                        or (hit.realizable and not evaluator.matches_samples(hit.to_dict(), spec)):
+                    errors.append(f"lookup at {d}x{w}")
+            if solved.realizable:
+                if cache.lookup(spec, depth + 1, width, dict(settings, engine='enumerate')) is not None:
+                    errors.append("hit for other settings")
+                if cache.lookup(spec, depth + 1, width, settings, pad_smaller=False) is not None:
+                    errors.append("padded hit without pad_smaller")
+            else:
+                hit = cache.lookup(spec, depth, width, dict(settings, engine='enumerate'))
+                if hit is None or hit.realizable:
+                    errors.append("no not realizable hit for other settings")
+                if cache.lookup(spec, depth + 1, width, settings) is not None:
+                    errors.append("not realizable hit for a larger size")
+            if errors:
+                mismatches += 1
+                print("cache:", spec, "realizable:", solved.realizable, "errors:", errors)
+    return mismatches
+
+
+if __name__ == "__main__":
+    cli_parser = argparse.ArgumentParser(
+        "crosscheck.py",
+        description="Cross-checks the enumerator, prune, the preanalysis and the result cache on random specifications",
+    )
+    cli_parser.add_argument("--seed", help="seed of the random specifications", type=int, default=0)
+    cli_parser.add_argument("--specs", help="number of random specifications per check", metavar="N", type=int,
+                            default=120)
+    cli_parser.add_argument("--networks", help="number of random networks for prune", metavar="N", type=int,
+                            default=3000)
+    cli_parser.add_argument("--budget", help="seconds the enumerator may take per specification", metavar="SECONDS",
+                            type=float, default=10)
+    cli_parser.add_argument("checks", nargs="*", metavar="CHECK",
+                            help="the checks to run: enumerator, prune, preanalysis, cache. By default all")
+    ns = cli_parser.parse_args()
+
+    checks = {
+        'enumerator': lambda rng: check_enumerator(rng, ns.specs, ns.budget),
+        'prune': lambda rng: check_prune(rng, ns.networks),
+        'preanalysis': lambda rng: check_preanalysis(rng, ns.specs),
+        'cache': lambda rng: check_cache(rng, ns.specs),
+    }
+    for name in ns.checks:
+        if name not in checks:
+            cli_parser.error(f"unknown check '{name}', choose from {', '.join(checks)}")
+    failed = False
+    for name in ns.checks or checks:
+        mismatches = checks[name](random.Random(ns.seed))
+        print(f"{name}: {mismatches} mismatches")
+        failed |= mismatches > 0
+    sys.exit(1 if failed else 0)
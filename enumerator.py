@@ -0,0 +1,209 @@
+"""Bottom-up enumeration of layered networks over the value vectors of the samples.
+Two nodes of the same type with the same values on all samples are interchangeable (observational equivalence), so a
+layer is represented by the distinct value vectors it can compute, independent of the width. A backward search then
+selects at most width vectors per layer that compute the outputs.
+"""
+
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from evaluator import apply_op
+from network import OP_SIGNS, UNARY_CODES, COMMUTATIVE_CODES
+from printer import NetworkPrinter, NetworkNode
+
+# vectors with larger values are dropped, so the product of two values fits into int64
+BOUND = 2 ** 31
+# number of operand pairs a chunk of applications and a whole layer may have
+CHUNK = 2 ** 16
+MAX_APPLICATIONS = 2 * 10 ** 7
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class Enumerator:
+    def __init__(self, inputs: Dict[str, str], outputs: Dict[str, str], samples: List[Dict], depth: int,
+                 width: int, deadline: float = None):
+        """
+        :param deadline: Value of time.monotonic() after which the enumeration gives up
+        """
+        self.inputs = inputs
+        self.outputs = outputs
+        self.samples = samples
+        self.depth = depth
+        self.width = width
+        self.deadline = deadline
+        # whether every layer holds all vectors it can compute, then a failed search shows that there is no network
+        self.complete = True
+        # the distinct vectors of the layers 0..depth-2 as (values, is_int), one row per vector
+        self.layers = []
+        self.producer_cache = {}
+        self.failed = set()
+
+    def check_budget(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceeded()
+
+    def vectors(self, names, types):
+        rows = [[int(sample[x]) for sample in self.samples] for x in names]
+        if any(abs(v) > BOUND for row in rows for v in row):
+            self.complete = False
+            return None
+        return (np.array(rows, dtype=np.int64).reshape(len(rows), len(self.samples)),
+                np.array([types[x] == 'int' for x in names], dtype=bool))
+
+    def sources(self, d: int):
+        """
+        :return: The vectors the nodes of layer d take as operands
+        """
+        return self.layers[d - 1] if d > 0 else self.input_vectors
+
+    def applications(self, op: int, values: np.ndarray, is_int: np.ndarray):
+        """
+        Applies op to all pairs of operands of its type
+        :return: Chunks of (results, in_0, in_1) with one row per pair
+        """
+        operands = np.flatnonzero(is_int == (op <= 6))
+        if op in UNARY_CODES:
+            yield apply_op(OP_SIGNS[op], values[operands], values[operands], False), operands, operands
+            return
+        b = values[operands][None, :, :]
+        step = max(1, CHUNK // max(len(operands), 1))
+        for start in range(0, len(operands), step):
+            self.check_budget()
+            first = operands[start:start + step]
+            results = apply_op(OP_SIGNS[op], values[first][:, None, :], b, False)
+            yield (results.reshape(len(first) * len(operands), values.shape[1]),
+                   np.repeat(first, len(operands)), np.tile(operands, len(first)))
+
+    def expand(self, values: np.ndarray, is_int: np.ndarray):
+        """
+        Computes the distinct vectors of the next layer
+        """
+        if len(values) ** 2 * len(OP_SIGNS) > MAX_APPLICATIONS:
+            raise BudgetExceeded()
+        parts, types = [], []
+        for op in range(len(OP_SIGNS)):
+            for results, _, _ in self.applications(op, values, is_int):
+                parts.append(results)
+                types.append(np.full(len(results), op <= 4))
+        values, is_int = np.concatenate(parts), np.concatenate(types)
+
+        small = np.abs(values).max(axis=1, initial=0) <= BOUND
+        if not small.all():
+            self.complete = False
+            values, is_int = values[small], is_int[small]
+        _, first = np.unique(np.column_stack([is_int, values]), axis=0, return_index=True)
+        first.sort()
+        return values[first], is_int[first]
+
+    def producers(self, d: int, target: bytes, target_int: bool):
+        """
+        :return: All (op, in_0, in_1) of layer d that compute the target vector, in_0 and in_1 index the sources
+        """
+        key = (d, target, target_int)
+        if key not in self.producer_cache:
+            values, is_int = self.sources(d)
+            vector = np.frombuffer(target, dtype=np.int64)
+            found = []
+            for op in (range(0, 5) if target_int else range(5, 11)):
+                for results, in_0, in_1 in self.applications(op, values, is_int):
+                    for h in np.flatnonzero((results == vector).all(axis=1)):
+                        if op not in COMMUTATIVE_CODES or in_0[h] <= in_1[h]:
+                            found.append((op, int(in_0[h]), int(in_1[h])))
+            self.producer_cache[key] = found
+        return self.producer_cache[key]
+
+    def search(self, d: int, targets):
+        """
+        Selects the nodes of layer d that compute the targets (vector as bytes, is_int) and, recursively, the nodes of
+        the layers below
+        :return: The layers 0..d as lists of NetworkNode, layer d in the order of the targets, or None
+        """
+        options = [self.producers(d, *target) for target in targets]
+        if not all(options):
+            return None
+        if d == 0:
+            names = list(self.inputs)
+            return [[NetworkNode(OP_SIGNS[op], names[i], names[j]) for op, i, j in (o[0] for o in options)]]
+
+        values, is_int = self.sources(d)
+        order = sorted(range(len(targets)), key=lambda t: len(options[t]))
+        chosen = [None] * len(targets)
+
+        def choose(position: int, operands: List[int]):
+            if position == len(order):
+                key = (d - 1, frozenset(operands))
+                if key in self.failed:
+                    return None
+                below = self.search(d - 1, [(values[i].tobytes(), bool(is_int[i])) for i in operands])
+                if below is None:
+                    self.failed.add(key)
+                    return None
+                index = {i: n for n, i in enumerate(operands)}
+                return below + [[NetworkNode(OP_SIGNS[op], index[i], index[j]) for op, i, j in chosen]]
+
+            t = order[position]
+            # producers that reuse the selected operands first
+            for op, i, j in sorted(options[t], key=lambda p: (p[1] not in operands) + (p[2] not in operands)):
+                new = [x for x in dict.fromkeys((i, j)) if x not in operands]
+                if len(operands) + len(new) > self.width:
+                    continue
+                chosen[t] = (op, i, j)
+                network = choose(position + 1, operands + new)
+                if network is not None:
+                    return network
+            return None
+
+        return choose(0, [])
+
+    def run(self):
+        """
+        :return: The network, a not realizable network if the enumeration shows that there is none, or None
+        """
+        self.input_vectors = self.vectors(list(self.inputs), self.inputs)
+        outputs = self.vectors(list(self.outputs), self.outputs)
+        if self.input_vectors is None or outputs is None or not self.inputs or not self.outputs:
+            return None
+
+        targets = list(dict.fromkeys((row.tobytes(), bool(t)) for row, t in zip(*outputs)))
+        if len(targets) <= self.width:
+            for d in range(self.depth - 1):
+                self.layers.append(self.expand(*self.sources(d)))
+            layers = self.search(self.depth - 1, targets)
+        else:
+            layers = None
+
+        if layers is None:
+            if not self.complete:
+                return None
+            printer = NetworkPrinter(self.depth, self.width, self.outputs)
+            printer.set_realizable(False)
+            return printer
+
+        printer = NetworkPrinter(self.depth, self.width, self.outputs)
+        printer.set_realizable(True)
+        for d, layer in enumerate(layers):
+            # unused nodes repeat the first node of the layer
+            for w in range(self.width):
+                printer.set_node(d, w, layer[w] if w < len(layer) else layer[0])
+        for (name, t), row in zip(self.outputs.items(), outputs[0]):
+            printer.set_output(name, targets.index((row.tobytes(), t == 'int')))
+        return printer
+
+
+def enumerate_network(inputs: Dict[str, str], outputs: Dict[str, str], samples: List[Dict], depth: int, width: int,
+                      budget: float = None) -> NetworkPrinter:
+    """
+    Synthesizes a network by enumeration
+    :param budget: Seconds after which the enumeration gives up. Omitting: no limit
+    :return: The network, a not realizable network if the enumeration shows that there is none, or None if it gave up
+    """
+    deadline = None if budget is None else time.monotonic() + budget
+    try:
+        return Enumerator(inputs, outputs, samples, depth, width, deadline).run()
+    except BudgetExceeded:
+        return None
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""Evaluates a network (a Network or as written by NetworkPrinter.print) on all samples at once with NumPy arrays.
+Booleans are 0/1 and division follows div0: SMT-LIB integer division, division by zero yields 0.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from network import Network, smt_div
+
+# int64 operands whose result may exceed this bound are evaluated again with Python integers
+LIMIT = 2 ** 62
+
+
+class Overflow(Exception):
+    pass
+
+
+def magnitude(a: np.ndarray) -> int:
+    return int(np.abs(a).max(initial=0))
+
+
+def apply_op(op: str, a: np.ndarray, b: np.ndarray, checked: bool) -> np.ndarray:
+    """
+    :param checked: Raises Overflow if the result may not fit into int64
+    """
+    if checked and op in ('+', '-', 'or') and magnitude(a) + magnitude(b) >= LIMIT:
+        raise Overflow()
+    if checked and op in ('*', 'and', 'or') and magnitude(a) * magnitude(b) >= LIMIT:
+        raise Overflow()
+
+    match op:
+        case '+': return a + b
+        case '-': return a - b
+        case '*': return a * b
+        case '/': return smt_div(a, b)
+        case '<': return (a < b).astype(a.dtype)
+        case '=': return (a == b).astype(a.dtype)
+        case 'and': return a * b
+        case 'or': return (a + b) - (a * b)
+        case 'not': return 1 - a
+        case _: return a
+
+
+def evaluate(network, inputs: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Evaluates the network on arrays of input values
+    :param network: The Network, or its dictionary with layers and emitted
+    :param inputs: Maps the input names to one value per sample
+    :return: Maps the output names to one value per sample
+    """
+    if not isinstance(network, Network):
+        network = Network.from_dict(network)
+    try:
+        return evaluate_as(network, {x: np.asarray(v, dtype=np.int64) for x, v in inputs.items()}, True)
+    except (Overflow, OverflowError):
+        return evaluate_as(network, {x: np.array([int(i) for i in v], dtype=object) for x, v in inputs.items()},
+                           False)
+
+
+def evaluate_as(network: Network, inputs: Dict[str, np.ndarray], checked: bool) -> Dict[str, np.ndarray]:
+    prev = None
+    for lidx in range(network.depth):
+        source = inputs if lidx == 0 else prev
+        values = []
+        for op, in_0, in_1 in network.layer(lidx):
+            a = source[in_0]
+            b = a if in_1 is None else source[in_1]
+            values.append(apply_op(op, a, b, checked))
+        prev = values
+    return {name: prev[nidx] for name, nidx in zip(network.outputs, network.emitted)}
+
+
+def sample_arrays(samples: List[Dict], names) -> Dict[str, np.ndarray]:
+    """
+    Collects the values of the given names over all samples, booleans become 0/1
+    """
+    return {x: np.array([int(sample[x]) for sample in samples], dtype=object) for x in names}
+
+
+def failing_samples(network, spec: Dict) -> List[int]:
+    """
+    :return: The indices of the samples of the specification whose outputs the network does not compute
+    """
+    samples = spec['samples']
+    if not samples:
+        return []
+    actual = evaluate(network, sample_arrays(samples, spec['inputs']))
+    expected = sample_arrays(samples, spec['outputs'])
+    wrong = np.zeros(len(samples), dtype=bool)
+    for x in spec['outputs']:
+        wrong |= (np.asarray(actual[x], dtype=object) != expected[x]).astype(bool)
+    return np.flatnonzero(wrong).tolist()
+
+
+def matches_samples(network, spec: Dict) -> bool:
+    """
+    Checks whether the network computes the outputs of every sample of the specification
+    """
+    return not failing_samples(network, spec)
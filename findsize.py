@@ -2,6 +2,8 @@
 
 from io import StringIO
 import argparse
+import multiprocessing
+import multiprocessing.connection
 import tempfile
 import subprocess
 import time
@@ -9,27 +11,41 @@ from pathlib import Path
 import yaml
 
 NOT_REALIZABLE = 'not realizable'
+UNKNOWN = 'unknown'
 
 
-def findsize(filename: Path, ns: argparse.Namespace):
+def findsize(filename: Path, ns: argparse.Namespace, probe=None):
+    """
+    Searches the minimal width for every depth
+    :param probe: Callable (width, depth) -> bool that tells whether a network of this size exists, or None if the
+                  probe gave up. Omitting: runs fsynth in a subprocess for every probe
+    """
+    if probe is None:
+        probe = lambda w, d: validate(filename, w, d, ns.fsynth, ns.cache)
+
     width = ns.width
     for depth in range(1, ns.depth):
         print("Depth: ", depth, "Width:", width)
-        suc = validate(filename, width, depth, ns.fsynth)
+        suc = probe(width, depth)
         if suc:
             print("Found solution with depth:", depth, "Descrease width")
+            # bisection between a width without solution and one with solution
+            last_failing_width = 0
             last_working_width = width
-            try_width = last_working_width/2
-            while last_working_width != try_width:
-                suc = validate(filename, try_width, depth, ns.fsynth)
+            # an unknown probe is bisected like a failing one, but does not show that smaller widths fail
+            proven = True
+            while last_working_width - last_failing_width > 1:
+                try_width = (last_failing_width + last_working_width) // 2
+                suc = probe(try_width, depth)
                 if suc:
                     last_working_width = try_width
-                    try_width = int( last_working_width/2 )
                 else:
-                    try_width = int( (try_width + last_working_width)/2 )
+                    last_failing_width = try_width
+                    proven = proven and suc is not None
 
-            print(f"size found {filename} with width:{try_width} and depth:{depth}")
-            update(filename, try_width, depth)
+            print(f"size found {filename} with width:{last_working_width} and depth:{depth}"
+                  + ("" if proven else " (not proven minimal, a smaller width is unknown)"))
+            update(filename, last_working_width, depth)
 
 
 def update(filename: Path, w: int, d: int, target: Path = None):
@@ -49,14 +65,175 @@ def update(filename: Path, w: int, d: int, target: Path = None):
 
 
 
-def validate(filename: Path, width: int, depth: int, fsynth: str):
+class IncrementalProbe:
+    """
+    Answers all probes of a file with one solver: the encoding is built once for the maximal size and every
+    smaller size is checked under assumptions, so learned clauses carry over between the probes.
+    """
+    def __init__(self, filename: Path, width: int, depth: int, **encoding):
+        from fsynth import NetworkEncoder
+        import z3
+
+        with filename.open() as fp:
+            spec = yaml.safe_load(fp)
+
+        self.filename = filename
+        self.sat, self.unknown = z3.sat, z3.unknown
+        self.s = z3.Solver()
+        self.encoder = NetworkEncoder(self.s, spec['inputs'], spec['outputs'], depth, width,
+                                      resizable=True, **encoding)
+        for sample in spec['samples']:
+            self.encoder.add_sample(sample)
+
+    def __call__(self, width: int, depth: int):
+        width, depth = int(width), int(depth)
+        start = time.process_time()
+        ans = self.s.check(*self.encoder.size_assumptions(depth, width))
+        stop = time.process_time()
+        print(f"Test {self.filename} w:{width} d:{depth} in {stop-start} ms")
+        print("Solution: ", ans)
+        return None if ans == self.unknown else ans == self.sat
+
+
+class SizeGrid:
+    """
+    Known answers of the (depth, width) grid. A network of size (d, w) also realizes every larger size, since
+    unused nodes can be added and layers of id nodes can be appended, so each answer decides a whole region.
+    A probe that gave up decides nothing, its size stays open but is not probed again.
+    """
+    def __init__(self, width: int, depth: int):
+        self.widths = range(1, width + 1)
+        self.depths = range(1, depth)
+        self.realizable = []
+        self.not_realizable = []
+        self.unknown = set()
+
+    def add(self, width: int, depth: int, suc):
+        """
+        :param suc: Whether the size is realizable, None if the probe gave up
+        """
+        if suc is None:
+            self.unknown.add((width, depth))
+        else:
+            (self.realizable if suc else self.not_realizable).append((width, depth))
+
+    def status(self, width: int, depth: int):
+        """
+        :return: True or False if the answer of the size is known, otherwise None
+        """
+        if any(w <= width and d <= depth for w, d in self.realizable):
+            return True
+        if any(w >= width and d >= depth for w, d in self.not_realizable):
+            return False
+        return None
+
+    def open(self, depth: int, running=()):
+        """
+        Returns the widths of the depth whose answer is neither known nor currently probed nor given up
+        """
+        return [w for w in self.widths if self.status(w, depth) is None and (w, depth) not in running
+                and (w, depth) not in self.unknown]
+
+    def next_probe(self, running):
+        """
+        Selects the middle open width of the depth with the most open widths, which halves the largest region
+        """
+        open_widths = {d: self.open(d, running) for d in self.depths}
+        depth = max(self.depths, key=lambda d: len(open_widths[d]), default=None)
+        if depth is None or not open_widths[depth]:
+            return None
+        widths = open_widths[depth]
+        return widths[len(widths) // 2], depth
+
+    def minimal_width(self, depth: int):
+        """
+        :return: The smallest realizable width of the depth (or None) and whether every smaller width is known to be
+                 not realizable
+        """
+        width = next((w for w in self.widths if self.status(w, depth)), None)
+        return width, width is not None and all(self.status(w, depth) is False for w in range(1, width))
+
+
+def probe_process(filename: Path, width: int, depth: int, cache: bool, conn):
+    """
+    Solves one size of the grid with a fresh solver (or the result cache of fsynth if cache) and sends whether it is
+    realizable through conn, None if fsynth gave up
+    """
+    from fsynth import cli_parser, synthesize
+
+    with filename.open() as fp:
+        spec = yaml.safe_load(fp)
+    network = synthesize(spec, depth, width, cli_parser.parse_args([] if cache else ['--no-cache']))
+    conn.send(None if getattr(network, 'unknown', False) else network.realizable)
+
+
+def findsize_parallel(filename: Path, ns: argparse.Namespace):
+    """
+    Searches the minimal width for every depth by probing up to ns.jobs sizes at once in separate processes.
+    Probes whose answer follows from the answer of another probe are killed.
+    """
+    grid = SizeGrid(ns.width, ns.depth)
+    running = {}
+
+    while True:
+        while len(running) < ns.jobs:
+            size = grid.next_probe(running)
+            if size is None:
+                break
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=probe_process, args=(filename, *size, ns.cache, sender))
+            process.start()
+            sender.close()
+            running[size] = (process, receiver, time.time())
+
+        if not running:
+            break
+
+        ready = multiprocessing.connection.wait([receiver for process, receiver, start in running.values()])
+        for size, (process, receiver, start) in list(running.items()):
+            if receiver not in ready:
+                continue
+            try:
+                suc = receiver.recv()
+            except EOFError:
+                # the probe died without answer, e.g. killed by the memory limit
+                suc = None
+            process.join()
+            del running[size]
+            width, depth = size
+            print(f"Test {filename} w:{width} d:{depth} in {time.time() - start} s")
+            print("Solution: ", {True: "sat", False: "unsat", None: "unknown"}[suc])
+            grid.add(width, depth, suc)
+
+        for size, (process, receiver, start) in list(running.items()):
+            if grid.status(*size) is not None:
+                print(f"Cancel {filename} w:{size[0]} d:{size[1]}")
+                process.kill()
+                process.join()
+                del running[size]
+
+    for depth in grid.depths:
+        width, proven = grid.minimal_width(depth)
+        if width is not None:
+            print(f"size found {filename} with width:{width} and depth:{depth}"
+                  + ("" if proven else " (not proven minimal, a smaller width is unknown)"))
+            update(filename, width, depth)
+
+
+def validate(filename: Path, width: int, depth: int, fsynth: str, cache: bool = False):
+    """
+    Runs fsynth on the file with the given size
+    :return: Whether fsynth found a network, None if it gave up or failed
+    """
     fsynth = Path(fsynth).absolute()
+    n2x = (Path(__file__).parent / "network2x.py").absolute()
 
 
     tmp = Path(tempfile.mktemp(".yaml", "fsynth_input"))
     update(filename, width, depth, target=tmp)
 
-    cli = f"cat {tmp.absolute()} | python3 {fsynth} | tail -n 1"
+    # network2x reduces the network to one line: the SMT expression, "not realizable" or "unknown"
+    cli = f"cat {tmp.absolute()} | python3 {fsynth} {'' if cache else '--no-cache'} | python3 {n2x} --to-smt -"
     print("Execute: ", cli)
     start = time.process_time()
     status, out = subprocess.getstatusoutput(cli)
@@ -64,10 +241,13 @@ def validate(filename: Path, width: int, depth: int, fsynth: str):
     print(f"Test {filename} w:{width} d:{depth} in {stop-start} ms")
 
     if status != 0:
-        return False
+        return None
 
+    out = out.splitlines()[-1] if out else ''
     print("Solution: ", out)
 
+    if out == UNKNOWN:
+        return None
     return out != NOT_REALIZABLE
 
 
@@ -119,9 +299,19 @@ if __name__ == '__main__':
     cli_parser.add_argument("--fsynth", help="path to the fsynth.py", default="fsynth.py")
     cli_parser.add_argument("--width", help="maximal width", metavar="INT", type=int, default=10)
     cli_parser.add_argument("--depth", help="maximal depth", metavar="INT", type=int, default=10)
+    cli_parser.add_argument("--incremental", action="store_true",
+                            help="probe all sizes of a file with one solver in this process instead of running fsynth")
+    cli_parser.add_argument("--cache", action="store_true",
+                            help="use the result cache of fsynth, by default every size is solved anew")
+    cli_parser.add_argument("--jobs", help="number of sizes probed in parallel processes", metavar="INT", type=int,
+                            default=1)
     cli_parser.add_argument("files", action='append', help="YAML files", metavar="FILENAME")
 
     ns = cli_parser.parse_args()
 
     for fil in ns.files:
-        findsize(Path(fil), ns)
+        if ns.jobs > 1:
+            findsize_parallel(Path(fil), ns)
+            continue
+        probe = IncrementalProbe(Path(fil), ns.width, ns.depth) if ns.incremental else None
+        findsize(Path(fil), ns, probe)
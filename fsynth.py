@@ -1,201 +1,1628 @@
 #!/usr/bin/python3
 
 from printer import NetworkPrinter, NetworkNode
+try:
+    from network import OP_SIGNS, UNARY_CODES, COMMUTATIVE_CODES, smt_div
+except ImportError:
+    # fsynth.py is handed in alone: the op tables and the division of network.py
+    OP_SIGNS = ['+', '-', '*', '/', 'id', '<', '=', 'and', 'or', 'not', 'id']
+    UNARY_CODES = (4, 9, 10)
+    COMMUTATIVE_CODES = (0, 2, 6, 7, 8)
+
+    def smt_div(a, b):
+        return ((b > 0) * 1 - (b < 0) * 1) * (a // (abs(b) + (b == 0)))
+import argparse
+import json
+import os
+import resource
 import sys
+import time
 import yaml
+from collections import Counter
+from contextlib import contextmanager
 from typing import Dict, List
 from z3 import *
 
-# Read the specification given via stdin
-# spec = yaml.safe_load(sys.stdin)
-#Mein code:
-
-yaml_file_path = "problems/sat_const_bool.yaml"
-
-# YAML-Datei laden
-try:
-    with open(yaml_file_path, "r") as file:
-        spec = yaml.safe_load(file)
-except FileNotFoundError:
-    print(f"Fehler: Datei '{yaml_file_path}' nicht gefunden.", file=sys.stderr)
-    sys.exit(1)
-except yaml.YAMLError as e:
-    print(f"Fehler beim Laden der YAML-Datei: {e}", file=sys.stderr)
-    sys.exit(1)
-
-inputs: Dict[str, str] = spec['inputs']
-outputs: Dict[str, str] = spec['outputs']
-samples: List[Dict[str, str]] = spec['samples']
-depth = int(spec['depth'])
-width = int(spec['width'])
-
-output_printer = NetworkPrinter(depth, width, outputs)
+cli_parser = argparse.ArgumentParser("fsynth.py",
+                                     description="""Synthesizes a layered network for the given specification.""")
+cli_parser.add_argument("--cegis", action="store_true",
+                        help="counterexample-guided mode: encode only the samples needed to fix the candidate network")
+cli_parser.add_argument("--cegis-seed", action="store", type=int, default=1, metavar="INT",
+                        help="number of samples the CEGIS loop starts with (default: 1)")
+cli_parser.add_argument("--cegis-result", action="store_true",
+                        help="use the result formula of the specification as CEGIS oracle in addition to the samples. "
+                             "Its counterexamples can make the rounds much harder, so the formula is given up if a "
+                             "round or the search for a counterexample takes longer than one second")
+cli_parser.add_argument("--symbolic-layer0", action="store_true",
+                        help="encode the first layer with symbolic arithmetic instead of a table of concrete results")
+cli_parser.add_argument("--dual-sort", action="store_true",
+                        help="give every node an Int and a Bool value, so boolean gates become propositional logic")
+cli_parser.add_argument("--symmetry-breaking", action="store_true",
+                        help="order the nodes of a layer and the operands of commutative and unary ops canonically")
+cli_parser.add_argument("--wires", choices=["sum", "implies", "onehot"], default="sum",
+                        help="encoding of the selected operands: a sum of if-then-else terms (default), an auxiliary "
+                             "variable tied to the index by implications, or the same with one-hot selector bits")
+cli_parser.add_argument("--bitvector", action="store_true",
+                        help="solve with bit-vector values and verify the network over the integers")
+cli_parser.add_argument("--bv-bits", action="store", type=int, metavar="INT",
+                        help="bit width of the first bit-vector attempt (default: derived from the samples)")
+cli_parser.add_argument("--portfolio", action="store_true",
+                        help="race several solver configurations in parallel processes, the first answer wins")
+cli_parser.add_argument("--portfolio-size", action="store", type=int, metavar="INT",
+                        help="number of configurations the portfolio races (default: all)")
+cli_parser.add_argument("--sharded", action="store_true",
+                        help="race the full encoding against subsets of the samples, an unsatisfiable subset shows "
+                             "that the specification is not realizable")
+cli_parser.add_argument("--shard-size", action="store", type=int, default=3, metavar="INT",
+                        help="number of samples of a shard (default: 3)")
+cli_parser.add_argument("--shard-workers", action="store", type=int, default=2, metavar="INT",
+                        help="number of processes of --sharded, including the full encoding (default: 2)")
+cli_parser.add_argument("--decompose", action="store_true",
+                        help="synthesize the outputs one by one in parallel processes and merge the networks, "
+                             "falls back to solving them jointly if the merged network is too wide")
+cli_parser.add_argument("--minimize", choices=["nodes", "depth"],
+                        help="minimize the nodes the outputs depend on, or the layers that do more than pass values "
+                             "on, with z3 Optimize")
+cli_parser.add_argument("--no-prune", action="store_true",
+                        help="print all nodes, also the ones no output depends on")
+cli_parser.add_argument("--engine", choices=["auto", "smt", "enumerate"], default="auto",
+                        help="auto (default): try the bottom-up enumeration for --enum-budget seconds before z3, "
+                             "smt: z3 only, enumerate: the enumeration only, without time limit")
+cli_parser.add_argument("--enum-budget", action="store", type=float, default=1.0, metavar="SECONDS",
+                        help="seconds the enumeration of --engine auto and --fallback enumerate may take "
+                             "(default: 1)")
+cli_parser.add_argument("--timeout", action="store", type=float, metavar="SECONDS",
+                        help="z3 gives up a check after the given seconds and the result is unknown. The limit "
+                             "applies to every check, the CEGIS loop and --bitvector may make several")
+cli_parser.add_argument("--rlimit", action="store", type=int, metavar="INT",
+                        help="z3 gives up a check after the given resource units, a cut-off that is reproducible "
+                             "across machines")
+cli_parser.add_argument("--fallback", choices=["none", "cegis", "enumerate"], default="none",
+                        help="strategy that runs if z3 gives up: the CEGIS loop under the same limits, or the "
+                             "enumeration with --enum-budget (default: none)")
+cli_parser.add_argument("--output-format", choices=["yaml", "json", "binary"], default="yaml",
+                        help="prints the network as YAML (default), or as JSON or binary form of network.Network")
+cli_parser.add_argument("--stats", action="store_true", help="report the number of assertions on stderr")
+cli_parser.add_argument("--profile", action="store_true",
+                        help="report wall time and peak memory per phase, the z3 statistics and the formula size on stderr")
+cli_parser.add_argument("--profile-json", action="store_true", help="report the profile as JSON")
+cli_parser.add_argument("--dump-smt2", action="store", metavar="FILE",
+                        help="write the encoding as SMT2 to FILE for offline replay. Only the plain z3 mode builds "
+                             "it, so the enumeration and the cache are skipped, the other modes and --batch are "
+                             "rejected, and nothing is written if the preanalysis decides without encoding")
+cli_parser.add_argument("--no-preanalysis", action="store_true",
+                        help="always build the encoding, without the fast checks for unrealizable specifications")
+cli_parser.add_argument("--no-cache", action="store_true", help="neither read nor write the result cache")
+cli_parser.add_argument("--cache-dir", action="store", metavar="DIR",
+                        help="directory of the result cache (default: $FSYNTH_CACHE or ~/.cache/fsynth)")
+cli_parser.add_argument("--cache-size", action="store", type=int, default=1000, metavar="INT",
+                        help="number of specifications the result cache keeps (default: 1000)")
+cli_parser.add_argument("-v", "--verbose", action="store_true", help="report progress on stderr")
+cli_parser.add_argument("--batch", action="store_true",
+                        help="synthesize every YAML document of the input one after another and print a network per "
+                             "document as soon as it is done, an unknown block for one that cannot be read. A "
+                             "document is read once the next '---' line or the end of the input arrives")
+cli_parser.add_argument("--paths", action="store_true",
+                        help="with --batch the input lists the paths of the specifications, one per line")
+cli_parser.add_argument("--workers", action="store", type=int, default=1, metavar="INT",
+                        help="with --batch the number of processes, the networks are printed in input order "
+                             "(default: 1)")
+cli_parser.add_argument("file", nargs="?", default="-",
+                        help="YAML file of the specification. Omitting: sys.stdin")
 
-s = Solver()
-
-# TODO Encode the given specification into SMT constraints
 
 def div0(a, b):
     return If(b == 0, 0, a / b)
 
 # '+', '-', '*', '/', 'id  '<', '==', 'and', 'or', 'not', 'id'
 #  0 ,  1 ,  2 ,  3 ,  4 ,  5 ,   6  ,  7  ,   8  ,  9  , 10
-# optype = True: optype is int, otherwise bool 
+# optype = True: optype is int, otherwise bool
 def apply_op(op, a, b):
-    
-    return If(op == 0, a + b, 
-                If(op == 1, a - b,  
-                If(op == 2, a * b,  
-                If(op == 3, div0(a, b),  
-                If(op == 4, a ,   
-                If(op == 5, a < b,  
-                If(op == 6, a == b,  
+
+    return If(op == 0, a + b,
+                If(op == 1, a - b,
+                If(op == 2, a * b,
+                If(op == 3, div0(a, b),
+                If(op == 4, a ,
+                If(op == 5, a < b,
+                If(op == 6, a == b,
                 If(op == 7, a*b,  # And
                 If(op == 8, (a+b) - (a*b), # Or
-                If(op == 9, 1 - a, a)))))))))) # Not            
-
-
-def initialize_layers():
-    layers = []
-    for d in range(depth):
-        layer = []
-        for w in range(width):
-            op = Int(f'op_{d}_{w}')
-            optype = Bool(f'optype_{d}_{w}')
-            s.add(And(op >= 0, op <= 10)) 
-            # optype is the type of the output, True means Int output
-            s.add(optype == If(op <= 4, True, False)) # TODO identity does not work 
-            in_0 = Int(f'in0_{d}_{w}')
-            in_1 = Int(f'in1_{d}_{w}')
-            out = Int(f'out_{d}_{w}')
-            # operation is fixed, while the output changes for each sample!
-            values = []
-            for i in range(len(samples)):
-                values.append(Int(f'value_{d}_{w}_{i}'))
-            layer.append((op, optype, in_0, in_1, values))
-        layers.append(layer)
-
-    return layers
-
-# Geniale funktion!!!! frfr
-# da alle einträge außer der ausgewählten 0 sind, regelt die summe den rest
-# TODO every indix is only allowed once 
-def select_value(input_values, index):
-    n = len(input_values)  
-    s.add(index < n)
-    s.add(index >= 0)
-    return Sum([If(index == i, input_values[i], 0) for i in range(n)])
-
-def select_value_bool(input_values, index):
-    n = len(input_values)
-    s.add(index < n)
-    s.add(index >= 0)
-    return Or([And(index == i, input_values[i]) for i in range(n)])
- 
-layers = initialize_layers()
-
-input_vars = list()
-output_vars = list()
-
-input_vars = {name: Int(name) for name, dtype in inputs.items()}
-output_vars = {name: Int(name) for name, dtype in outputs.items()}
-# input_vars = {name: Int(name) if dtype == 'int' else Bool(name) for name, dtype in inputs.items()}
-# output_vars = {name: Int(name) if dtype == 'int' else Bool(name) for name, dtype in outputs.items()}
-# print("input varts: ", input_vars)
-
-# Connect inputs to the first layer
-for w, (op, optype, in_0, in_1, values) in enumerate(layers[0]):
-    s.add(Or([in_0 == i for i in range(len(input_vars))])) 
-    s.add(Or([in_1 == i for i in range(len(input_vars))]))
-
-
-for d in range(len(layers)):
-    layer = layers[d]
-    for w, (op, optype, in_0, in_1, values) in enumerate(layer):
-        for i, sample in enumerate(samples):
-            # print("Sample: ", sample)
-
-            if d == 0:
-                input_values = []
-                for input_vars_index, name in enumerate(input_vars):
-                    input_values.append(sample[name])
-                    # falls intput int ist wähle eine inputtype int operation aus
-
-                    if inputs[name] == 'int':
-                        s.add(If(in_0 == input_vars_index, op <= 6, True))
-                        s.add(If(in_1 == input_vars_index, op <= 6, True))
-                    else:
-                        s.add(If(in_0 == input_vars_index, op > 6, True))
-                        s.add(If(in_1 == input_vars_index, op > 6, True))
-            else:
-                input_values = []
-                for block_index, prev_block in enumerate(layers[d - 1]):
-                    (op_prev, optype_prev, in_0_prev, in_1_prev, values_prev) = prev_block
-                    input_values.append(values_prev[i])
+                If(op == 9, 1 - a, a)))))))))) # Not
+
+
+# dual-sort encoding: ops 0-4 write the Int lane of a node, ops 5-10 its Bool lane
+INT_OPS = range(0, 5)
+BOOL_OPS = range(5, 11)
+
+
+def apply_int_op(op, a, b, div=div0):
+    return If(op == 0, a + b,
+                If(op == 1, a - b,
+                If(op == 2, a * b,
+                If(op == 3, div(a, b), a))))
+
+
+def apply_bool_op(op, a, b, p, q):
+    # a, b are the Int lanes and p, q the Bool lanes of the operands
+    return If(op == 5, a < b,
+                If(op == 6, a == b,
+                If(op == 7, And(p, q),
+                If(op == 8, Or(p, q),
+                If(op == 9, Not(p), p)))))
+
+
+def bv_div0(a, b):
+    """
+    div0 on bit-vectors with the rounding of SMT-LIB integer division (the remainder is never negative)
+    """
+    q = a / b  # signed division, rounds towards zero
+    return If(b == 0, 0, If(SRem(a, b) < 0, If(b > 0, q - 1, q + 1), q))
+
+
+def apply_bv_op(op, a, b):
+    """
+    apply_op on bit-vectors, the comparisons yield 0/1 like the boolean ops
+    """
+    one, zero = BitVecVal(1, a.size()), BitVecVal(0, a.size())
+    return If(op == 0, a + b,
+                If(op == 1, a - b,
+                If(op == 2, a * b,
+                If(op == 3, bv_div0(a, b),
+                If(op == 4, a,
+                If(op == 5, If(a < b, one, zero),
+                If(op == 6, If(a == b, one, zero),
+                If(op == 7, a * b,
+                If(op == 8, (a + b) - (a * b),
+                If(op == 9, 1 - a, a))))))))))
+
+
+def bitvector_width(samples: List[Dict[str, int]]) -> int:
+    """
+    Number of bits that holds the product of any two sample values as a signed bit-vector
+    """
+    magnitude = max((abs(int(v)) for sample in samples for v in sample.values()), default=1)
+    return 2 * max(magnitude.bit_length(), 1) + 2
+
+
+def eval_op(op: int, a: int, b: int) -> int:
+    """
+    Evaluates the operation with index op on concrete values, booleans are 0/1 like in apply_op
+    """
+    a, b = int(a), int(b)
+    return [a + b, a - b, a * b, smt_div(a, b), a, int(a < b), int(a == b),
+            a * b, (a + b) - (a * b), 1 - a, a][op]
+
+
+class NetworkEncoder:
+    """
+    Encodes a layered network of fixed depth and width into the constraints of a solver.
+    Samples can be added one after another, which allows the CEGIS loop to grow the encoding incrementally.
+    """
+    def __init__(self, s: Solver, inputs: Dict[str, str], outputs: Dict[str, str], depth: int, width: int,
+                 table_layer0: bool = True, dual_sort: bool = False, resizable: bool = False,
+                 symmetry_breaking: bool = False, wires: str = 'sum', bits: int = None):
+        """
+        :param bits: Encodes the node values as bit-vectors of this width instead of unbounded integers
+        """
+        self.s = s
+        self.bits = bits
+        self.wires = wires
+        # with wires == 'onehot' the selector bits of every index variable, see selectors
+        self.onehot = {}
+        self.wire_count = 0
+        self.table_layer0 = table_layer0
+        self.dual_sort = dual_sort
+        self.inputs = inputs
+        self.outputs = outputs
+        self.depth = depth
+        self.width = width
+        self.samples = []
+        self.by_inputs = {}
+
+        self.layers = self.initialize_layers()
+        # with dual_sort every node also has a Bool value per sample, the values of layers only hold the Int lane
+        self.bool_values = [[[] for w in range(width)] for d in range(depth)]
+        self.input_vars = {name: Int(name) for name, dtype in inputs.items()}
+        self.output_vars = {name: Int(name) for name, dtype in outputs.items()}
+        self.output_index = {name: Int(f'output_index_{name}') for name in outputs}
+        # input_vars = {name: Int(name) if dtype == 'int' else Bool(name) for name, dtype in inputs.items()}
+        # output_vars = {name: Int(name) if dtype == 'int' else Bool(name) for name, dtype in outputs.items()}
 
+        # Connect inputs to the first layer
+        for w, (op, optype, in_0, in_1, values) in enumerate(self.layers[0]):
+            s.add(Or([in_0 == i for i in range(len(self.input_vars))]))
+            s.add(Or([in_1 == i for i in range(len(self.input_vars))]))
+
+        self.structure_constraints()
+
+        if symmetry_breaking:
+            self.break_symmetries()
+
+        if resizable:
+            self.layer_off = [Bool(f'layer_off_{d}') for d in range(depth)]
+            self.node_off = [Bool(f'node_off_{w}') for w in range(width)]
+            self.resize_constraints()
+
+        # number of the sample-independent assertions, see statistics
+        self.structure_size = len(s.assertions())
+
+    def structure_constraints(self):
+        """
+        Adds the constraints that do not depend on the samples: the ranges of the node inputs and output indices
+        and the type compatibility between connected nodes. They are asserted once, add_sample only adds values.
+        """
+        s = self.s
+        for w, (op, optype, in_0, in_1, values) in enumerate(self.layers[0]):
+            for input_vars_index, name in enumerate(self.input_vars):
+                # falls intput int ist wähle eine inputtype int operation aus
+                if self.inputs[name] == 'int':
+                    s.add(If(in_0 == input_vars_index, op <= 6, True))
+                    s.add(If(in_1 == input_vars_index, op <= 6, True))
+                else:
+                    s.add(If(in_0 == input_vars_index, op > 6, True))
+                    s.add(If(in_1 == input_vars_index, op > 6, True))
+
+        for d in range(1, self.depth):
+            for w, (op, optype, in_0, in_1, values) in enumerate(self.layers[d]):
+                s.add(And(in_0 >= 0, in_0 < self.width, in_1 >= 0, in_1 < self.width))
+                for block_index, (op_prev, optype_prev, in_0_prev, in_1_prev, values_prev) in \
+                        enumerate(self.layers[d - 1]):
                     s.add(If(in_0 == block_index, If(optype_prev, op <= 6, op > 6), True))
                     s.add(If(in_1 == block_index, If(optype_prev, op <= 6, op > 6), True))
 
-            s.add(values[i] == apply_op(op, select_value(input_values, in_0), select_value(input_values, in_1)))
+        last_optypes = [optype for (op, optype, in_0, in_1, values) in self.layers[-1]]
+        for name, output_index in self.output_index.items():
+            s.add(And(output_index >= 0, output_index < self.width))
+            if self.outputs[name] == 'int':
+                s.add(self.select_value_bool(last_optypes, output_index))
+            else:
+                s.add(Not(self.select_value_bool(last_optypes, output_index)))
+
+    def statistics(self) -> Dict[str, int]:
+        """
+        Counts the assertions of the encoding, split into the sample-independent structure and the samples,
+        and the variables
+        """
+        assertions = self.s.assertions()
+        return {'samples': len(self.samples), 'assertions': len(assertions), 'structure': self.structure_size,
+                'per_sample': (len(assertions) - self.structure_size) // max(len(self.samples), 1),
+                'variables': count_variables(assertions)}
 
+    def resize_constraints(self):
+        """
+        Allows to switch off trailing layers and nodes by the literals layer_off and node_off, which makes the
+        encoding of the maximal size usable for every smaller size (see size_assumptions).
+        A layer that is switched off passes every value of the previous layer through by identity nodes,
+        a node that is switched off can only be read by nodes that are switched off as well.
+        """
+        s = self.s
+        for d in range(1, self.depth):
+            for w, (op, optype, in_0, in_1, values) in enumerate(self.layers[d]):
+                optype_prev = self.layers[d - 1][w][1]
+                s.add(Implies(self.layer_off[d], And(in_0 == w, in_1 == w, op == If(optype_prev, 4, 10))))
 
-# add constraints to output
+        for j in range(self.width):
+            for d in range(1, self.depth):
+                for w, (op, optype, in_0, in_1, values) in enumerate(self.layers[d]):
+                    if w != j:
+                        s.add(Implies(And(self.node_off[j], Not(self.node_off[w])), And(in_0 != j, in_1 != j)))
+            for output_index in self.output_index.values():
+                s.add(Implies(self.node_off[j], output_index != j))
 
-possible_outputs = []
-for (op, optype, in_0, in_1, values) in layers[-1]:
-    possible_outputs.append(values)
+    def break_symmetries(self):
+        """
+        Excludes equivalent networks: the nodes of a layer can be permuted (together with the inputs of the next
+        layer), commutative ops accept both operand orders and unary ops ignore in_1.
+        Every network can be brought into the canonical form layer by layer, so no realizable size gets lost.
+        """
+        s = self.s
+        for d, layer in enumerate(self.layers):
+            n = len(self.input_vars) if d == 0 else self.width
+            keys = []
+            for op, optype, in_0, in_1, values in layer:
+                s.add(Implies(Or([op == o for o in COMMUTATIVE_CODES]), in_0 <= in_1))
+                s.add(Implies(Or([op == o for o in UNARY_CODES]), in_1 == in_0))
+                # lexicographic order of (op, in_0, in_1)
+                keys.append(op * n * n + in_0 * n + in_1)
+            for key, next_key in zip(keys, keys[1:]):
+                s.add(key <= next_key)
 
-last_optypes = []
-for (op, optype, in_0, in_1, values) in layers[-1]:
-    last_optypes.append(optype)
+    def cone_of_influence(self):
+        """
+        Adds a Bool per node that holds iff an output depends on the node: it is emitted or an operand of a used node
+        of the next layer (the second operand of unary ops does not count)
+        :return: The Bools per layer and node
+        """
+        s = self.s
+        used = [[Bool(f'used_{d}_{w}') for w in range(self.width)] for d in range(self.depth)]
+        for w in range(self.width):
+            s.add(used[-1][w] == Or([index == w for index in self.output_index.values()]))
+        for d in range(self.depth - 1):
+            for w in range(self.width):
+                users = [And(used[d + 1][v], Or(in_0 == w, And(in_1 == w, Not(Or([op == u for u in UNARY_CODES])))))
+                         for v, (op, optype, in_0, in_1, values) in enumerate(self.layers[d + 1])]
+                s.add(used[d][w] == Or(users))
+        return used
 
-for i, sample in enumerate(samples):
-    for name in output_vars:
-        output_index = Int(f'output_index_{name}')
+    def size_assumptions(self, depth: int, width: int):
+        """
+        Returns the assumptions that restrict a resizable encoding to a network of the given size
+        """
+        return self.layer_off[depth:] + self.node_off[width:]
+
+    def value_var(self, name: str):
+        return Int(name) if self.bits is None else BitVec(name, self.bits)
+
+    def initialize_layers(self):
+        layers = []
+        for d in range(self.depth):
+            layer = []
+            for w in range(self.width):
+                op = Int(f'op_{d}_{w}')
+                optype = Bool(f'optype_{d}_{w}')
+                self.s.add(And(op >= 0, op <= 10))
+                # optype is the type of the output, True means Int output
+                self.s.add(optype == If(op <= 4, True, False)) # TODO identity does not work
+                in_0 = Int(f'in0_{d}_{w}')
+                in_1 = Int(f'in1_{d}_{w}')
+                # operation is fixed, while the output changes for each sample!
+                # the values are created by add_sample
+                values = []
+                layer.append((op, optype, in_0, in_1, values))
+            layers.append(layer)
+
+        return layers
+
+    # Geniale funktion!!!! frfr
+    # da alle einträge außer der ausgewählten 0 sind, regelt die summe den rest
+    # TODO every indix is only allowed once
+    # the range of index is asserted once by structure_constraints
+    def select_value(self, input_values, index):
+        n = len(input_values)
+        if self.wires == 'sum':
+            return Sum([If(index == i, input_values[i], 0) for i in range(n)])
+        return self.wire(self.value_var, input_values, index)
+
+    def select_value_bool(self, input_values, index):
+        n = len(input_values)
+        if self.wires == 'sum':
+            return Or([And(index == i, input_values[i]) for i in range(n)])
+        return self.wire(Bool, input_values, index)
+
+    def wire(self, sort, input_values, index):
+        """
+        Creates an auxiliary variable for the selected value, tied to every possible value by an implication
+        :param sort: value_var or Bool
+        """
+        operand = sort(f'wire_{self.wire_count}')
+        self.wire_count += 1
+        for selected, value in zip(self.selectors(index, len(input_values)), input_values):
+            self.s.add(Implies(selected, operand == value))
+        return operand
+
+    def selectors(self, index, n):
+        """
+        Returns the conditions under which index selects the values 0 to n-1. With wires == 'onehot' these are
+        Boolean selector bits (exactly one of them is true) that are shared by all samples.
+        """
+        if self.wires != 'onehot':
+            return [index == i for i in range(n)]
+        if index.get_id() not in self.onehot:
+            bits = [Bool(f'{index}_is_{i}') for i in range(n)]
+            self.s.add(PbEq([(bit, 1) for bit in bits], 1))
+            for i, bit in enumerate(bits):
+                self.s.add(bit == (index == i))
+            self.onehot[index.get_id()] = bits
+        return self.onehot[index.get_id()]
+
+    def lookup_value(self, value, op, in_0, in_1, input_values, ops=range(len(OP_SIGNS))):
+        """
+        Constrains value to the result of the node on concrete input values. Every (op, in_0, in_1) result is computed
+        in advance, so the node becomes a finite choice over constants instead of nonlinear arithmetic.
+        """
+        n = len(input_values)
+        table = {}
+        for o in ops:
+            for j in range(n):
+                for k in range(n):
+                    result = eval_op(o, input_values[j], input_values[k])
+                    if is_bool(value):
+                        result = result != 0
+                    table.setdefault(result, []).append(And(op == o, in_0 == j, in_1 == k))
+        for result, choices in table.items():
+            self.s.add(Implies(Or(choices), value == result))
+
+    def add_sample(self, sample: Dict[str, int]):
+        """
+        Adds the constraints for one sample: a fresh copy of the node values and the expected outputs
+        :param sample: Maps the input and output names to their values
+        """
+        s = self.s
+        i = len(self.samples)
+        self.samples.append(sample)
+
+        # the network is a function: samples with the same inputs share all node values
+        key = tuple(sample[name] for name in self.input_vars)
+        same = self.by_inputs.setdefault(key, i)
+
+        for d, layer in enumerate(self.layers):
+            for w, (op, optype, in_0, in_1, values) in enumerate(layer):
+                bools = self.bool_values[d][w]
+                if same != i:
+                    values.append(values[same])
+                    if self.dual_sort:
+                        bools.append(bools[same])
+                    continue
+                values.append(self.value_var(f'value_{d}_{w}_{i}'))
+                if self.dual_sort:
+                    bools.append(Bool(f'bvalue_{d}_{w}_{i}'))
+
+                if d == 0 and self.bits is not None and not self.table_layer0:
+                    input_values = [BitVecVal(int(sample[name]), self.bits) for name in self.input_vars]
+                elif d == 0:
+                    input_values = [sample[name] for name in self.input_vars]
+                else:
+                    input_values = [values_prev[i] for (_, _, _, _, values_prev) in self.layers[d - 1]]
+
+                if d == 0 and self.table_layer0 and self.dual_sort:
+                    self.lookup_value(values[i], op, in_0, in_1, input_values, INT_OPS)
+                    self.lookup_value(bools[i], op, in_0, in_1, input_values, BOOL_OPS)
+                elif d == 0 and self.table_layer0:
+                    self.lookup_value(values[i], op, in_0, in_1, input_values)
+                elif self.dual_sort:
+                    if d == 0:
+                        input_bools = [BoolVal(bool(sample[name])) for name in self.input_vars]
+                    else:
+                        input_bools = [prev[i] for prev in self.bool_values[d - 1]]
+                    a, b = self.select_value(input_values, in_0), self.select_value(input_values, in_1)
+                    p, q = self.select_value_bool(input_bools, in_0), self.select_value_bool(input_bools, in_1)
+                    s.add(values[i] == apply_int_op(op, a, b, div0 if self.bits is None else bv_div0))
+                    s.add(bools[i] == apply_bool_op(op, a, b, p, q))
+                else:
+                    apply = apply_op if self.bits is None else apply_bv_op
+                    s.add(values[i] == apply(op, self.select_value(input_values, in_0), self.select_value(input_values, in_1)))
+
+        # add constraints to output
+        possible_outputs = [values[i] for (op, optype, in_0, in_1, values) in self.layers[-1]]
+
+        for name in self.output_vars:
+            output_index = self.output_index[name]
+
+            if self.dual_sort and self.outputs[name] != 'int':
+                possible_bools = [bools[i] for bools in self.bool_values[-1]]
+                s.add(self.select_value_bool(possible_bools, output_index) == bool(sample[name]))
+            else:
+                s.add(int(sample[name]) == self.select_value(possible_outputs, output_index))
+
+    def decode(self, model, depth: int = None, width: int = None) -> NetworkPrinter:
+        """
+        Synthesizes the network given by the SMT model
+        :param depth: The depth of the network if the encoding was restricted by size_assumptions
+        :param width: The width of the network if the encoding was restricted by size_assumptions
+        """
+        depth = self.depth if depth is None else depth
+        width = self.width if width is None else width
+        output_printer = NetworkPrinter(depth, width, self.outputs)
+        output_printer.set_realizable(True)
+
+        for w, (op, optype, in_0, in_1, values) in enumerate(self.layers[0][:width]):
+            name0 = next((name for i, name in enumerate(self.input_vars) if i == model.eval(in_0, True).as_long()), "")
+            name1 = next((name for i, name in enumerate(self.input_vars) if i == model.eval(in_1, True).as_long()), "")
+
+            node = NetworkNode(OP_SIGNS[model.eval(op, True).as_long()], name0, name1)
+            output_printer.set_node(0, w, node)
+
+        for d, layer in enumerate(self.layers[1:depth], start = 1):
+            for w, (op, optype, in_0, in_1, values) in enumerate(layer[:width]):
+                node = NetworkNode(OP_SIGNS[model.eval(op, True).as_long()],
+                                   model.eval(in_0, True).as_long(),  model.eval(in_1, True).as_long())
+                output_printer.set_node(d, w, node)
+
+        for name in self.output_vars:
+            output_printer.set_output(name, model.eval(self.output_index[name], True).as_long())
+
+        return output_printer
+
+
+def count_variables(exprs) -> int:
+    """
+    Counts the distinct uninterpreted constants in the expressions, every shared subterm is visited once
+    """
+    seen, variables = set(), set()
+    todo = list(exprs)
+    while todo:
+        e = todo.pop()
+        if e.get_id() in seen:
+            continue
+        seen.add(e.get_id())
+        if is_const(e) and e.decl().kind() == Z3_OP_UNINTERPRETED:
+            variables.add(e.get_id())
+        todo.extend(e.children())
+    return len(variables)
+
+
+def with_div0(e, cache=None):
+    """
+    Rewrites every division in e such that division by zero yields 0, like the '/' of the network
+    """
+    if cache is None:
+        cache = {}
+    if e.get_id() in cache:
+        return cache[e.get_id()]
+    children = [with_div0(c, cache) for c in e.children()]
+    if is_app_of(e, Z3_OP_DIV) or is_app_of(e, Z3_OP_IDIV):
+        r = If(children[1] == 0, 0, children[0] / children[1])
+    elif children:
+        r = e.decl()(*children)
+    else:
+        r = e
+    cache[e.get_id()] = r
+    return r
+
+
+# milliseconds a CEGIS round with counterexamples of the result formula, and the search for such a counterexample,
+# may take before the result formula is given up
+ORACLE_ROUND_TIMEOUT = 1000
+
+
+class ResultOracle:
+    """
+    Checks a candidate network against the result formula of the specification with a second solver
+    """
+    def __init__(self, result: str, inputs: Dict[str, str], outputs: Dict[str, str]):
+        def make_var(x, t):
+            return Int(x) if t == 'int' else Bool(x)
+
+        self.inputs = {x: make_var(x, t) for x, t in inputs.items()}
+        self.outputs = {x: make_var(x, t) for x, t in outputs.items()}
+        decls = dict(self.inputs)
+        decls.update(self.outputs)
+        self.result = with_div0(And(parse_smt2_string(f'(assert {result})', decls=decls)))
+
+    def counterexample(self, network: NetworkPrinter):
+        """
+        Searches for inputs on which the network disagrees with the result formula
+        :return: The counterexample as a sample, or None if the network satisfies the result formula or the search
+                 takes longer than ORACLE_ROUND_TIMEOUT
+        """
+        # the outputs of the network, next to the outputs of the result formula
+        computed = {x: FreshConst(var.sort(), x) for x, var in self.outputs.items()}
+        v = Solver()
+        v.set('timeout', min(ORACLE_ROUND_TIMEOUT, int(get_param('timeout'))))
+        v.add(self.result)
+        v.add(network_formula(network, dict(self.inputs, **computed)))
+        v.add(Or([out != computed[x] for x, out in self.outputs.items()]))
+        if v.check() != sat:
+            return None
+        model = v.model()
+        sample = {}
+        for x, var in list(self.inputs.items()) + list(self.outputs.items()):
+            value = model.eval(var, True)
+            sample[x] = value.as_long() if is_int(var) else is_true(value)
+        return sample
+
+
+def printer_outputs(network: NetworkPrinter, inputs: Dict, apply) -> Dict:
+    """
+    Computes the outputs of the layers of the printer, for the printer.py of the template, which has no to_network
+    :param inputs: Maps the input names to their values
+    :param apply: Applies an op sign to the values of the two operands
+    """
+    prev = inputs
+    for layer in network.nodes:
+        prev = [None if node is None
+                else apply(node.op, prev[node.in_0], prev[node.in_0 if node.in_1 is None else node.in_1])
+                for node in layer]
+    return {x: prev[w] for x, w in network.outputs.items()}
+
+
+def z3_op(op: str, a, b):
+    return {'+': lambda: a + b, '-': lambda: a - b, '*': lambda: a * b, '/': lambda: If(b == 0, 0, a / b),
+            '<': lambda: a < b, '=': lambda: a == b, 'and': lambda: And(a, b), 'or': lambda: Or(a, b),
+            'not': lambda: Not(a)}.get(op, lambda: a)()
+
+
+def network_formula(network: NetworkPrinter, variables) -> BoolRef:
+    """
+    The equations of the outputs of the network, see network.Network.to_z3
+    :param variables: Maps the input and output names to z3 constants
+    """
+    if hasattr(network, 'to_network'):
+        return network.to_network().to_z3(variables)
+    outputs = printer_outputs(network, variables, z3_op)
+    return And([variables[x] == value for x, value in outputs.items()])
+
+
+def failing_samples(network: NetworkPrinter, inputs: Dict[str, str], outputs: Dict[str, str],
+                    samples: List[Dict[str, int]]) -> List[Dict[str, int]]:
+    """
+    Evaluates the network on the samples with the NumPy evaluator of network.Network, or with eval_op next to the
+    printer.py of the template
+    :return: The samples whose outputs the network does not compute
+    """
+    if hasattr(network, 'to_network'):
+        failing = network.to_network().failing_samples({'inputs': inputs, 'outputs': outputs, 'samples': samples})
+        return [samples[i] for i in failing]
+
+    def apply(op, a, b):
+        return eval_op(OP_SIGNS.index(op), a, b)
+    return [sample for sample in samples
+            if any(int(sample[x]) != value
+                   for x, value in printer_outputs(network, {x: int(sample[x]) for x in inputs}, apply).items())]
+
+
+def print_statistics(encoder: NetworkEncoder):
+    print("stats:", ' '.join(f"{key}={value}" for key, value in encoder.statistics().items()), file=sys.stderr)
+
+
+class Profiler:
+    """
+    Collects the wall time and peak memory of the phases of a run, the z3 statistics and the size of the encoding
+    """
+    def __init__(self, enabled: bool = True):
+        """
+        :param enabled: Records nothing if False, so the profiler can be passed around unconditionally
+        """
+        self.enabled = enabled
+        self.phases = []
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield
+        if not self.enabled:
+            return
+        # ru_maxrss is the peak of the whole process so far (KiB on Linux)
+        self.phases.append({'phase': name, 'wall': time.perf_counter() - start,
+                            'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+
+    def add_solver(self, s: Solver):
+        if not self.enabled:
+            return
+        st = s.statistics()
+        self.counters.update({key: st.get_key_value(key) for key in st.keys()})
+
+    def report(self, as_json: bool = False):
+        if as_json:
+            json.dump({'phases': self.phases, 'counters': self.counters}, sys.stderr)
+            print(file=sys.stderr)
+            return
+        for phase in self.phases:
+            print(f"profile: {phase['phase']:10s} {phase['wall']:10.4f} s  peak {phase['peak_rss']} KiB",
+                  file=sys.stderr)
+        for key, value in self.counters.items():
+            print(f"profile: {key} = {value}", file=sys.stderr)
+
+
+def unrealizable_reason(inputs, outputs, samples, depth, width):
+    """
+    Cheap necessary conditions on the samples and types, checked before anything is encoded
+    :return: Why no network of this size exists, or None if the checks cannot tell
+    """
+    # the network is a function of its inputs
+    by_inputs = {}
+    for sample in samples:
+        key = tuple(int(sample[x]) for x in inputs)
+        values = tuple(int(sample[x]) for x in outputs)
+        if by_inputs.setdefault(key, values) != values:
+            return f"samples with the inputs {dict(zip(inputs, key))} have different outputs"
+
+    # a bool node never feeds an int op, so int values need an int input
+    if 'int' not in inputs.values():
+        for x, t in outputs.items():
+            if t == 'int':
+                return f"the int output {x} cannot be computed from bool inputs only"
+
+    # every output selects one node of the last layer, outputs of different type or values need different nodes
+    columns = {(t, tuple(int(sample[x]) for sample in samples)) for x, t in outputs.items()}
+    if len(columns) > width:
+        return f"the outputs need {len(columns)} different nodes in the last layer, but the width is {width}"
+
+    # an output depends on an input if two samples differ only in that input and in the output;
+    # a node of depth d reads at most 2^d inputs, the first layer at most 2 * width
+    depends = {x: set() for x in outputs}
+    for y in inputs:
+        groups = {}
+        for sample in samples:
+            others = tuple(int(sample[z]) for z in inputs if z != y)
+            groups.setdefault(others, []).append(sample)
+        for group in groups.values():
+            for x in outputs:
+                if len({int(sample[x]) for sample in group}) > 1:
+                    depends[x].add(y)
+    for x, ys in depends.items():
+        if len(ys) > 2 ** depth:
+            return f"the output {x} depends on {len(ys)} inputs, a network of depth {depth} reads at most {2 ** depth}"
+    used = set().union(*depends.values())
+    if len(used) > 2 * width:
+        return f"the outputs depend on {len(used)} inputs, a first layer of width {width} reads at most {2 * width}"
+
+    # with depth 1 every output is an op applied to two inputs, which can be tried on the samples directly
+    if depth == 1:
+        names = list(inputs)
+        for x, t in outputs.items():
+            ops = INT_OPS if t == 'int' else BOOL_OPS
+            if not any(all(eval_op(op, sample[a], sample[b]) == int(sample[x]) for sample in samples)
+                       for op in ops for a in names for b in names
+                       if (op <= 6) == (inputs[a] == 'int') and (op <= 6) == (inputs[b] == 'int')):
+                return f"no single node computes the output {x}"
+
+    return None
+
+
+def not_realizable(depth, width, outputs) -> NetworkPrinter:
+    output_printer = NetworkPrinter(depth, width, outputs)
+    output_printer.set_realizable(False)
+    return output_printer
+
+
+def unknown_network(depth, width, outputs, reason: str = "unknown") -> NetworkPrinter:
+    output_printer = NetworkPrinter(depth, width, outputs)
+    if hasattr(output_printer, 'set_unknown'):
+        output_printer.set_unknown(reason)
+    else:
+        # the printer.py of the template
+        output_printer.unknown, output_printer.reason_unknown = True, reason
+    return output_printer
+
+
+def is_unknown(network: NetworkPrinter) -> bool:
+    """
+    Whether the solver gave up on the network, the printer.py of the template has no unknown status
+    """
+    return getattr(network, 'unknown', False)
+
+
+def print_network(output_printer: NetworkPrinter, ns: argparse.Namespace):
+    """
+    Prints the network pruned in the format of the options. fsynth.py is handed in alone, with the printer.py of
+    the template, which only prints YAML and neither prunes nor knows the unknown status.
+    """
+    if hasattr(output_printer, 'prune'):
+        if not ns.no_prune:
+            output_printer.prune()
+        output_printer.print(ns.output_format)
+    elif is_unknown(output_printer):
+        print("# network")
+        yaml.dump({'unknown': True, 'reason': output_printer.reason_unknown}, sys.stdout)
+        print("# end_network")
+    else:
+        output_printer.print()
+
+
+def try_enumerate(inputs, outputs, samples, depth, width, budget: float):
+    """
+    Runs enumerator.enumerate_network, None if it gave up or if fsynth.py runs without enumerator.py
+    """
+    try:
+        from enumerator import enumerate_network
+    except ImportError:
+        return None
+    return enumerate_network(inputs, outputs, samples, depth, width, budget)
+
+
+def check_encoding(encoder: NetworkEncoder):
+    """
+    Checks the solver of the encoder
+    :return: The synthesized network, a not realizable network or None if the solver gave up (e.g. on the limits)
+    """
+    ans = encoder.s.check()
+    if ans == sat:
+        # There exists a model => function is realizable
+        return encoder.decode(encoder.s.model())
+    if ans == unsat:
+        return not_realizable(encoder.depth, encoder.width, encoder.outputs)
+    return None
+
+
+def solve(inputs, outputs, samples, depth, width, stats=False, solver: Solver = None, profiler: Profiler = None,
+          dump_smt2: str = None, **encoding) -> NetworkPrinter:
+    """
+    Encodes all samples at once and solves the resulting formula
+    :param stats: Reports the size of the encoding on stderr
+    :param solver: The solver to use. Omitting: a default z3 Solver
+    :param profiler: Records the phases encode, solve and decode
+    :param dump_smt2: Writes the encoding as SMT2 to this file
+    """
+    profiler = Profiler(False) if profiler is None else profiler
+    s = Solver() if solver is None else solver
+    with profiler.phase('encode'):
+        encoder = NetworkEncoder(s, inputs, outputs, depth, width, **encoding)
+        for sample in samples:
+            encoder.add_sample(sample)
+    if stats:
+        print_statistics(encoder)
+    if profiler.enabled:
+        profiler.counters.update(encoder.statistics())
+
+    if dump_smt2 is not None:
+        with open(dump_smt2, 'w') as fp:
+            fp.write(s.to_smt2())
+    with profiler.phase('solve'):
+        ans = s.check()
+    profiler.add_solver(s)
+    with profiler.phase('decode'):
+        network = encoder.decode(s.model()) if ans == sat else None
+    if ans == unknown:
+        return unknown_network(depth, width, outputs, s.reason_unknown())
+    if network is None:
+        return not_realizable(depth, width, outputs)
+    return network
 
-        s.add(sample[name] == select_value([row[i] for row in possible_outputs], output_index))
-        if outputs[name] == 'int':
-            s.add(select_value_bool(last_optypes, output_index))
-        else:
-            s.add(Not(select_value_bool(last_optypes, output_index)))
-        
-# print(s.to_smt2())
-ans = s.check()
 
-op_sign = ['+', '-', '*', '/', 'id', '<', '=', 'and', 'or', 'not', 'id']
+def solve_minimized(inputs, outputs, samples, depth, width, objective='nodes', verbose=False, stats=False,
+                    **encoding) -> NetworkPrinter:
+    """
+    Solves with z3 Optimize and minimizes the used nodes (see NetworkEncoder.cone_of_influence) in the same session
+    :param objective: 'nodes' minimizes the number of used nodes, 'depth' the number of layers with a used node that
+                      is not id (the other layers only pass values on and are dropped by NetworkPrinter.prune)
+    """
+    s = Optimize()
+    encoder = NetworkEncoder(s, inputs, outputs, depth, width, **encoding)
+    for sample in samples:
+        encoder.add_sample(sample)
+    used = encoder.cone_of_influence()
+    if stats:
+        print_statistics(encoder)
 
-if ans == sat:
-    # There exists a model => function is realizable
+    if objective == 'nodes':
+        cost = Sum([If(u, 1, 0) for layer in used for u in layer])
+    else:
+        cost = Sum([If(Or([And(u, op != 4, op != 10) for u, (op, optype, in_0, in_1, values) in zip(us, layer)]), 1, 0)
+                    for us, layer in zip(used, encoder.layers)])
+    s.minimize(cost)
+    ans = s.check()
+    if ans == unknown:
+        return unknown_network(depth, width, outputs, s.reason_unknown())
+    if ans != sat:
+        return not_realizable(depth, width, outputs)
     model = s.model()
+    if verbose:
+        print(f"minimize: {objective} {model.eval(cost)}", file=sys.stderr)
+    return encoder.decode(model)
+
+
+def solve_bitvector(inputs, outputs, samples, depth, width, bits=None, max_bits=128, verbose=False, stats=False,
+                    **encoding) -> NetworkPrinter:
+    """
+    Solves with bit-vector node values, where nonlinear operations are bit-blasted, and checks the decoded network
+    in integer semantics. A network that only works because of an overflow leads to a retry with twice the bits.
+    Since an unsatisfiable bit-vector encoding does not rule out a network over the integers, that case (and running
+    out of bits) falls back to solve.
+    :param bits: Width of the first attempt. Omitting: derived from the magnitudes of the sample values
+    """
+    def log(*args):
+        if verbose:
+            print("bitvector:", *args, file=sys.stderr)
+
+    bits = bits or bitvector_width(samples)
+    while bits <= max_bits:
+        log(f"solving with {bits} bits")
+        s = Solver()
+        encoder = NetworkEncoder(s, inputs, outputs, depth, width, bits=bits, **encoding)
+        for sample in samples:
+            encoder.add_sample(sample)
+        if stats:
+            print_statistics(encoder)
+        if s.check() != sat:
+            break
+        network = encoder.decode(s.model())
+        if not failing_samples(network, inputs, outputs, samples):
+            return network
+        log("the network overflows on the samples")
+        bits *= 2
+
+    log("falling back to integers")
+    return solve(inputs, outputs, samples, depth, width, stats, **encoding)
+
+
+def solve_cegis(inputs, outputs, samples, depth, width, result=None, seed=1, verbose=False, stats=False,
+                **encoding) -> NetworkPrinter:
+    """
+    Counterexample-guided synthesis: starts with the first seed samples and adds only the samples (and the
+    counterexamples to the result formula) the current candidate network gets wrong.
+    Counterexamples of the result formula are dropped again if they make the problem unsatisfiable or a round
+    longer than ORACLE_ROUND_TIMEOUT, since only the samples decide whether the specification is realizable.
+    """
+    def log(*args):
+        if verbose:
+            print("cegis:", *args, file=sys.stderr)
+
+    oracle = None
+    if result is not None:
+        try:
+            oracle = ResultOracle(result, inputs, outputs)
+        except Z3Exception as e:
+            log("ignoring the result formula:", e)
+
+    s = Solver()
+    encoder = NetworkEncoder(s, inputs, outputs, depth, width, **encoding)
+    # the samples of the specification that are part of the encoding
+    known = samples[:seed]
+    from_result = 0
+    for sample in known:
+        encoder.add_sample(sample)
+
+    while True:
+        log(f"solving with {len(encoder.samples)} samples, {from_result} of them from the result formula")
+        if stats:
+            print_statistics(encoder)
+        # z3 falls back to its weaker incremental engine once a solver has been checked,
+        # so every round checks a fresh solver with the assertions collected so far
+        round_solver = Solver()
+        round_solver.add(s.assertions())
+        if from_result > 0:
+            round_solver.set('timeout', min(ORACLE_ROUND_TIMEOUT, int(get_param('timeout'))))
+        ans = round_solver.check()
+        if ans == unknown and from_result == 0:
+            return unknown_network(depth, width, outputs, round_solver.reason_unknown())
+        if ans != sat:
+            if from_result == 0:
+                return not_realizable(depth, width, outputs)
+            reason = "is not realizable" if ans == unsat else "makes the round too hard"
+            log(f"the result formula {reason}, continue with the samples only")
+            oracle, from_result = None, 0
+            s = Solver()
+            encoder = NetworkEncoder(s, inputs, outputs, depth, width, **encoding)
+            for sample in known:
+                encoder.add_sample(sample)
+            continue
+
+        network = encoder.decode(round_solver.model())
+        missing = next(iter(failing_samples(network, inputs, outputs, samples)), None)
+        if missing is not None:
+            known.append(missing)
+        elif oracle is not None:
+            missing = oracle.counterexample(network)
+            from_result += missing is not None
+        if missing is None:
+            return network
+        log("counterexample:", missing)
+        encoder.add_sample(missing)
+
+
+# configurations raced by solve_portfolio: the z3 solver (random seed or tactic), the engine and encoding options
+PORTFOLIO = [
+    {},
+    {'encoding': {'wires': 'implies'}},
+    {'engine': 'bitvector'},
+    {'tactic': 'qfnia'},
+    {'seed': 1},
+    {'seed': 2, 'encoding': {'wires': 'onehot'}},
+    {'tactic': 'qfnia', 'encoding': {'dual_sort': True}},
+    {'engine': 'bitvector', 'encoding': {'wires': 'implies'}},
+]
+
+
+def make_solver(config: Dict) -> Solver:
+    s = Tactic(config['tactic']).solver() if 'tactic' in config else Solver()
+    if 'seed' in config:
+        s.set('random_seed', config['seed'])
+    return s
+
+
+def portfolio_worker(config: Dict, problem, encoding: Dict, conn):
+    """
+    Solves the problem (inputs, outputs, samples, depth, width) under one configuration of the portfolio and sends
+    the network through conn, or None if the solver gave up
+    """
+    inputs, outputs, samples, depth, width = problem
+    encoding = dict(encoding, **config.get('encoding', {}))
+    try:
+        if config.get('engine') == 'bitvector':
+            network = solve_bitvector(inputs, outputs, samples, depth, width, **encoding)
+            network = None if is_unknown(network) else network
+        else:
+            encoder = NetworkEncoder(make_solver(config), inputs, outputs, depth, width, **encoding)
+            for sample in samples:
+                encoder.add_sample(sample)
+            network = check_encoding(encoder)
+    except Z3Exception:
+        # e.g. a tactic that does not support the formula
+        network = None
+    conn.send(network)
+
+
+def solve_portfolio(inputs, outputs, samples, depth, width, configs=PORTFOLIO, verbose=False,
+                    **encoding) -> NetworkPrinter:
+    """
+    Races the configurations in separate processes, takes the first definitive answer and kills the others
+    """
+    import multiprocessing
+    import multiprocessing.connection
+
+    def log(*args):
+        if verbose:
+            print("portfolio:", *args, file=sys.stderr)
+
+    running = {}
+    for config in configs:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=portfolio_worker,
+                                          args=(config, (inputs, outputs, samples, depth, width), encoding, sender))
+        process.start()
+        sender.close()
+        running[receiver] = (process, config)
+
+    network = None
+    while running and network is None:
+        for receiver in multiprocessing.connection.wait(list(running)):
+            process, config = running.pop(receiver)
+            try:
+                network = receiver.recv()
+            except EOFError:
+                network = None
+            process.join()
+            if network is not None:
+                log("answer by", config)
+                break
+            log("no answer by", config)
+
+    for process, config in running.values():
+        process.kill()
+        process.join()
+
+    if network is None:
+        return unknown_network(depth, width, outputs, "no configuration of the portfolio answered")
+    return network
+
+
+def sample_shards(samples: List[Dict], outputs: Dict[str, str], size: int, seed: int = 0):
+    """
+    Yields up to len(samples) distinct subsets of size samples, drawn at random. Contradictions need samples with
+    different outputs, so a sample is drawn with a weight inverse to the number of samples with the same outputs.
+    """
+    import random
+
+    rng = random.Random(seed)
+    classes = Counter(tuple(sample[x] for x in outputs) for sample in samples)
+    weights = [1 / classes[tuple(sample[x] for x in outputs)] for sample in samples]
+    seen = set()
+    for _ in range(10 * len(samples)):
+        # weighted sampling without replacement: the size largest keys u^(1/w)
+        keys = [rng.random() ** (1 / w) for w in weights]
+        shard = tuple(sorted(sorted(range(len(samples)), key=keys.__getitem__)[-size:]))
+        if shard in seen:
+            continue
+        seen.add(shard)
+        yield [samples[i] for i in shard]
+        if len(seen) >= len(samples):
+            return
+
+
+def solve_sharded(inputs, outputs, samples, depth, width, shard_size=3, workers=2, verbose=False,
+                  **encoding) -> NetworkPrinter:
+    """
+    Solves the full encoding in one process and small subsets of the samples in the others. A network has to match
+    every subset of the samples, so the first unsatisfiable shard shows that the specification is not realizable.
+    Satisfiable shards prove nothing, the answer is then the one of the full encoding.
+    :param shard_size: Number of samples of a shard
+    :param workers: Number of processes, including the one of the full encoding
+    """
+    import multiprocessing
+    import multiprocessing.connection
+
+    def log(*args):
+        if verbose:
+            print("sharded:", *args, file=sys.stderr)
+
+    def start(shard):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=portfolio_worker,
+                                          args=({}, (inputs, outputs, shard, depth, width), encoding, sender))
+        process.start()
+        sender.close()
+        return receiver, process
+
+    if shard_size >= len(samples):
+        return solve(inputs, outputs, samples, depth, width, **encoding)
+
+    full, full_process = start(samples)
+    running = {full: full_process}
+    shards = sample_shards(samples, outputs, shard_size)
+
+    network = None
+    while network is None:
+        while len(running) < max(workers, 2):
+            shard = next(shards, None)
+            if shard is None:
+                break
+            receiver, process = start(shard)
+            running[receiver] = process
+
+        for receiver in multiprocessing.connection.wait(list(running)):
+            process = running.pop(receiver)
+            try:
+                answer = receiver.recv()
+            except EOFError:
+                answer = None
+            process.join()
+            if receiver is full:
+                log("answer by the full encoding")
+                network = answer if answer is not None else unknown_network(depth, width, outputs)
+                break
+            if answer is not None and not answer.realizable:
+                log("unsatisfiable shard")
+                network = not_realizable(depth, width, outputs)
+                break
+
+    for process in running.values():
+        process.kill()
+        process.join()
+    return network
+
+
+def output_groups(outputs: Dict[str, str], samples: List[Dict]) -> List[List[str]]:
+    """
+    Groups the outputs that have the same type and the same value in every sample, since one node computes them all
+    """
+    groups = {}
+    for name, dtype in outputs.items():
+        groups.setdefault((dtype, tuple(int(sample[name]) for sample in samples)), []).append(name)
+    return list(groups.values())
+
+
+def decompose_worker(spec: Dict, depth: int, max_width: int, ns: argparse.Namespace, conn):
+    """
+    Synthesizes the network of a sub-specification with the smallest width up to max_width and sends it through
+    conn, or None if there is none
+    """
+    for width in range(1, max_width + 1):
+        network = synthesize(spec, depth, width, ns)
+        if network.realizable:
+            conn.send(network)
+            return
+    conn.send(None)
+
+
+def merge_networks(networks: List[NetworkPrinter], depth: int, width: int, outputs: Dict[str, str]) -> NetworkPrinter:
+    """
+    Places the networks side by side in one network of the given size, shallower networks are padded with id nodes
+    and unused nodes repeat the first node of their layer
+    """
+    output_printer = NetworkPrinter(depth, width, outputs)
     output_printer.set_realizable(True)
-    # TODO synthesize the function given the SMT model
+    offset = 0
+    for network in networks:
+        for d, layer in enumerate(network.nodes):
+            for w, node in enumerate(layer):
+                if d > 0:
+                    node = NetworkNode(node.op, node.in_0 + offset,
+                                       None if node.in_1 is None else node.in_1 + offset)
+                output_printer.set_node(d, offset + w, node)
+        for name, index in network.outputs.items():
+            output_printer.set_output(name, index + offset)
+        offset += network.width
+    for d, layer in enumerate(output_printer.nodes):
+        for w in range(offset, width):
+            output_printer.set_node(d, w, layer[0])
+    return output_printer
+
+
+def solve_decomposed(spec: Dict, depth: int, width: int, ns: argparse.Namespace,
+                     profiler: Profiler = None) -> NetworkPrinter:
+    """
+    Synthesizes every group of outputs (see output_groups) on its own in parallel processes, each with the smallest
+    width that leaves one node to each other group, and merges the networks. If a group has no network within its
+    width or the merged network is wider than width, the outputs are solved jointly by z3.
+    """
+    import multiprocessing
+    import multiprocessing.connection
+
+    def log(*args):
+        if ns.verbose:
+            print("decompose:", *args, file=sys.stderr)
+
+    inputs, outputs, samples = spec['inputs'], spec['outputs'], spec['samples']
+    # the sub-problems run the whole pipeline, the joint problem was already tried by the enumeration
+    single = argparse.Namespace(**dict(vars(ns), decompose=False))
+    joint = argparse.Namespace(**dict(vars(single), engine='smt', no_preanalysis=True))
+    groups = output_groups(outputs, samples)
+    if len(groups) < 2 or len(groups) > width:
+        return synthesize_uncached(spec, depth, width, joint, profiler)
+
+    running = {}
+    for group in groups:
+        sub_spec = {'inputs': inputs, 'outputs': {name: outputs[name] for name in group},
+                    'samples': [{x: sample[x] for x in list(inputs) + group} for sample in samples]}
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=decompose_worker,
+                                          args=(sub_spec, depth, width - len(groups) + 1, single, sender))
+        process.start()
+        sender.close()
+        running[receiver] = (process, group)
+
+    networks = {}
+    while running:
+        for receiver in multiprocessing.connection.wait(list(running)):
+            process, group = running.pop(receiver)
+            try:
+                network = receiver.recv()
+            except EOFError:
+                network = None
+            process.join()
+            if network is None:
+                log("no network for", group)
+                break
+            log(f"width {network.width} for", group)
+            networks[tuple(group)] = network
+        else:
+            continue
+        break
+
+    for process, group in running.values():
+        process.kill()
+        process.join()
+
+    used = sum(network.width for network in networks.values())
+    if len(networks) < len(groups) or used > width:
+        log("solving the outputs jointly")
+        return synthesize_uncached(spec, depth, width, joint, profiler)
+    return merge_networks([networks[tuple(group)] for group in groups], depth, width, outputs)
+
+
+def encoding_options(ns: argparse.Namespace) -> Dict:
+    """
+    Returns the keyword arguments of NetworkEncoder given by the command line options
+    """
+    return dict(table_layer0=not ns.symbolic_layer0, dual_sort=ns.dual_sort,
+                symmetry_breaking=ns.symmetry_breaking, wires=ns.wires)
+
+
+def synthesize(spec: Dict, depth: int = None, width: int = None, ns: argparse.Namespace = None,
+               profiler: Profiler = None) -> NetworkPrinter:
+    """
+    Synthesizes a network for the specification, like running fsynth.py on it
+    :param spec: The specification with inputs, outputs and samples (and optionally result)
+    :param depth: The depth of the network. Omitting: the depth of the specification
+    :param width: The width of the network. Omitting: the width of the specification
+    :param ns: The options as parsed by cli_parser. Omitting: the defaults of the command line
+    :param profiler: Records the phases of the plain encoding, the other modes are recorded as one phase
+    """
+    if ns is None:
+        ns = cli_parser.parse_args([])
 
-    for w, (op, optype, in_0, in_1, values) in enumerate(layers[0]):
-        name0 = next((name for i, name in enumerate(input_vars) if i == model[in_0].as_long()), "")
-        name1 = next((name for i, name in enumerate(input_vars) if i == model[in_1].as_long()), "")
-        
-        node = NetworkNode(op_sign[model[op].as_long()], name0, name1)
-        output_printer.set_node(0, w, node)
+    depth = int(spec['depth'] if depth is None else depth)
+    width = int(spec['width'] if width is None else width)
 
-    for d, layer in enumerate(layers[1:], start = 1):
-        for w, (op, optype, in_0, in_1, values) in enumerate(layer):
-            node = NetworkNode(op_sign[model[op].as_long()],  model[in_0].as_long(),  model[in_1].as_long())
-            output_printer.set_node(d, w, node)
+    # the dump needs the encoding, not a stored result
+    cache = None if ns.no_cache or ns.dump_smt2 else open_cache(ns)
+    if cache is None:
+        return synthesize_uncached(spec, depth, width, ns, profiler)
 
-    for i, name in enumerate(output_vars):
-        output_index = Int(f'output_index_{name}')
-        model_output_index = model[output_index].as_long()
-        output_printer.set_output(name, model_output_index)
+    settings = {key: value for key, value in vars(ns).items() if key not in UNCACHED_OPTIONS}
+    # a padded smaller network is not minimal
+    network = cache.lookup(spec, depth, width, settings, pad_smaller=not ns.minimize)
+    if network is None:
+        network = synthesize_uncached(spec, depth, width, ns, profiler)
+        # an unknown result depends on the limits and the machine, a later run may answer
+        if not is_unknown(network):
+            cache.store(spec, depth, width, settings, network)
+    elif ns.verbose:
+        print("cache: hit", file=sys.stderr)
+    return network
 
-    # output_printer.set_output("f", 0)
+
+def open_cache(ns: argparse.Namespace):
+    """
+    :return: The ResultCache of the options, or None if fsynth.py runs without cache.py
+    """
+    try:
+        from cache import ResultCache, source_version
+    except ImportError:
+        return None
+    here = os.path.dirname(os.path.abspath(__file__))
+    return ResultCache(ns.cache_dir, ns.cache_size, source_version(os.path.join(here, name) for name in RESULT_SOURCES))
+
+
+# the sources of the code that computes the results, their hash is part of the key of the result cache
+RESULT_SOURCES = ['fsynth.py', 'enumerator.py', 'evaluator.py', 'network.py']
+
+# options that do not change the result of a synthesis
+UNCACHED_OPTIONS = {'file', 'verbose', 'stats', 'profile', 'profile_json', 'dump_smt2', 'no_cache', 'cache_dir',
+                    'cache_size', 'no_preanalysis', 'sharded', 'shard_size', 'shard_workers', 'no_prune',
+                    'output_format', 'batch', 'paths', 'workers', 'timeout', 'rlimit', 'fallback'}
+
+
+def synthesize_uncached(spec: Dict, depth: int, width: int, ns: argparse.Namespace,
+                        profiler: Profiler = None) -> NetworkPrinter:
+    inputs: Dict[str, str] = spec['inputs']
+    outputs: Dict[str, str] = spec['outputs']
+    samples: List[Dict[str, str]] = spec['samples']
+
+    if not ns.no_preanalysis:
+        reason = unrealizable_reason(inputs, outputs, samples, depth, width)
+        if reason is not None:
+            if ns.verbose:
+                print("preanalysis:", reason, file=sys.stderr)
+            if ns.dump_smt2:
+                print(f"Warnung: '{ns.dump_smt2}' nicht geschrieben, die Voranalyse entscheidet ohne Kodierung.",
+                      file=sys.stderr)
+            return not_realizable(depth, width, outputs)
+
+    profiler = Profiler(False) if profiler is None else profiler
+
+    if ns.engine != 'smt' and not ns.dump_smt2:
+        with profiler.phase('enumerate'):
+            if ns.engine == 'enumerate':
+                from enumerator import enumerate_network
+                network = enumerate_network(inputs, outputs, samples, depth, width)
+            else:
+                network = try_enumerate(inputs, outputs, samples, depth, width, ns.enum_budget)
+        if ns.verbose:
+            answer = "no answer" if network is None else "realizable" if network.realizable else "not realizable"
+            print("enumerate:", answer, file=sys.stderr)
+        if ns.engine == 'enumerate':
+            return unknown_network(depth, width, outputs, "enumeration gave up") if network is None else network
+        # the enumerated network is not minimal, only its absence is taken over by --minimize
+        if network is not None and not (ns.minimize and network.realizable):
+            return network
+
+    with solver_limits(ns.timeout, ns.rlimit):
+        return solve_with_fallback(spec, depth, width, ns, profiler)
+
+
+@contextmanager
+def solver_limits(timeout: float = None, rlimit: int = None):
+    """
+    Sets the limits of z3 for every solver created inside, also in forked processes, and restores the previous
+    limits afterwards. A limit applies to every check on its own, so the modes with several checks (CEGIS, the
+    retries of --bitvector) may spend it several times.
+    :param timeout: Seconds
+    :param rlimit: Resource units
+    """
+    limits = {}
+    if timeout is not None:
+        limits['timeout'] = int(timeout * 1000)
+    if rlimit is not None:
+        limits['rlimit'] = rlimit
+    previous = {key: get_param(key) for key in limits}
+    set_param(**limits)
+    try:
+        yield
+    finally:
+        set_param(**previous)
+
+
+def solve_with_fallback(spec: Dict, depth: int, width: int, ns: argparse.Namespace,
+                        profiler: Profiler) -> NetworkPrinter:
+    """
+    Solves with solve_strategy and, if z3 gives up, with the strategy of --fallback
+    """
+    inputs: Dict[str, str] = spec['inputs']
+    outputs: Dict[str, str] = spec['outputs']
+    samples: List[Dict[str, str]] = spec['samples']
+    encoding = encoding_options(ns)
+
+    network = solve_strategy(spec, depth, width, ns, profiler)
+    if is_unknown(network) and ns.fallback != 'none':
+        if ns.verbose:
+            print(f"fallback: z3 gave up ({network.reason_unknown}), trying {ns.fallback}", file=sys.stderr)
+        with profiler.phase('fallback'):
+            if ns.fallback == 'cegis':
+                fallback = solve_cegis(inputs, outputs, samples, depth, width,
+                                       spec.get('result') if ns.cegis_result else None, ns.cegis_seed,
+                                       ns.verbose, ns.stats, **encoding)
+            else:
+                fallback = try_enumerate(inputs, outputs, samples, depth, width, ns.enum_budget)
+        if fallback is not None:
+            network = fallback
+    return network
+
+
+def solve_strategy(spec: Dict, depth: int, width: int, ns: argparse.Namespace,
+                   profiler: Profiler) -> NetworkPrinter:
+    """
+    Solves with z3 in the mode selected by the options
+    """
+    inputs: Dict[str, str] = spec['inputs']
+    outputs: Dict[str, str] = spec['outputs']
+    samples: List[Dict[str, str]] = spec['samples']
+    encoding = encoding_options(ns)
+
+    if ns.minimize:
+        with profiler.phase('synthesize'):
+            return solve_minimized(inputs, outputs, samples, depth, width, ns.minimize, ns.verbose, ns.stats,
+                                   **encoding)
+
+    if ns.decompose:
+        return solve_decomposed(spec, depth, width, ns, profiler)
+
+    if not (ns.portfolio or ns.sharded or ns.bitvector or ns.cegis):
+        return solve(inputs, outputs, samples, depth, width, ns.stats, profiler=profiler, dump_smt2=ns.dump_smt2,
+                     **encoding)
+
+    with profiler.phase('synthesize'):
+        if ns.portfolio:
+            return solve_portfolio(inputs, outputs, samples, depth, width, PORTFOLIO[:ns.portfolio_size],
+                                   ns.verbose, **encoding)
+        elif ns.sharded:
+            return solve_sharded(inputs, outputs, samples, depth, width, ns.shard_size, ns.shard_workers,
+                                 ns.verbose, **encoding)
+        elif ns.bitvector:
+            return solve_bitvector(inputs, outputs, samples, depth, width, ns.bv_bits,
+                                   verbose=ns.verbose, stats=ns.stats, **encoding)
+        else:
+            return solve_cegis(inputs, outputs, samples, depth, width,
+                               spec.get('result') if ns.cegis_result else None, ns.cegis_seed, ns.verbose,
+                               ns.stats, **encoding)
+
+
+def yaml_documents(stream):
+    """
+    Yields the text of every YAML document of the stream as soon as the line that ends it is read. The stream is read
+    line by line, unlike yaml.safe_load_all, which waits for blocks of 64 KiB. Like yaml.safe_load_all, a document
+    starts at a '---' line and the text before the first one only counts if it is not blank.
+    """
+    def blank(lines):
+        return all(not line.strip() or line.lstrip().startswith('#') for line in lines)
+
+    lines, explicit = [], False
+    for line in stream:
+        marker = line.rstrip('\r\n')
+        if marker in ('---', '...') or marker.startswith('--- '):
+            if explicit or not blank(lines):
+                yield ''.join(lines)
+            # the content after '--- ' belongs to the new document
+            lines, explicit = [line[3:]] if marker.startswith('--- ') else [], marker != '...'
+        else:
+            lines.append(line)
+    if explicit or not blank(lines):
+        yield ''.join(lines)
+
+
+def read_specs(stream, paths: bool = False):
+    """
+    Yields the specifications of a batch as soon as they are read: the YAML documents of the stream, or the files
+    named by its lines. An item that cannot be read yields None and the reason instead of the specification.
+    """
+    if not paths:
+        for index, text in enumerate(yaml_documents(stream), 1):
+            try:
+                spec = yaml.safe_load(text)
+            except yaml.YAMLError as e:
+                print(f"Fehler beim Laden von Dokument {index}: {e}", file=sys.stderr)
+                yield None, f"cannot parse document {index}"
+                continue
+            if spec is None:
+                print(f"Fehler: Dokument {index} ist leer.", file=sys.stderr)
+                yield None, f"document {index} is empty"
+            else:
+                yield spec, None
+        return
+    for line in stream:
+        path = line.strip()
+        if not path:
+            continue
+        try:
+            with open(path, "r") as file:
+                yield yaml.safe_load(file), None
+        except (OSError, yaml.YAMLError) as e:
+            print(f"Fehler: Datei '{path}' nicht lesbar: {e}", file=sys.stderr)
+            yield None, f"cannot read {path}"
+
+
+def synthesize_item(item):
+    """
+    Synthesizes the network of one (specification, reason, options) of a batch. An item that was not read or is no
+    valid specification gives an unknown network with the reason.
+    :return: The network and whether it was synthesized
+    """
+    spec, reason, ns = item
+    if spec is not None:
+        try:
+            return synthesize(spec, ns=ns), True
+        except (KeyError, TypeError, ValueError) as e:
+            reason = f"invalid specification: {e!r}"
+            print(f"Fehler: Ungültige Spezifikation: {e!r}", file=sys.stderr)
+    return unknown_network(0, 0, {}, reason), False
+
+
+def run_batch(stream, ns: argparse.Namespace) -> bool:
+    """
+    Synthesizes the specifications of the stream (see read_specs), with ns.workers processes, and prints the networks
+    in input order, each as soon as it and the ones before are done
+    :return: Whether every specification was synthesized
+    """
+    items = ((spec, reason, ns) for spec, reason in read_specs(stream, ns.paths))
+    if ns.workers > 1:
+        # the workers of a ProcessPoolExecutor are not daemonic, so --portfolio, --sharded and --decompose can start
+        # their own processes in them
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(ns.workers) as pool:
+            return print_batch(map_ordered(pool, synthesize_item, items, 2 * ns.workers), ns)
+    return print_batch(map(synthesize_item, items), ns)
+
+
+def map_ordered(pool, function, items, window: int):
+    """
+    Like pool.map, but submits the items from a thread while the results are yielded, so a result is yielded as soon
+    as it and the ones before are done, even if the next item is not read yet
+    :param window: Number of items submitted but not yet yielded, which bounds the items held in memory
+    """
+    import queue
+    import threading
+
+    futures = queue.Queue(window)
+
+    def submit():
+        try:
+            for item in items:
+                futures.put(pool.submit(function, item))
+        except BaseException as e:
+            futures.put(e)
+        else:
+            futures.put(None)
+
+    # daemonic, so a consumer that stops early is not blocked by a full window
+    threading.Thread(target=submit, daemon=True).start()
+    while (future := futures.get()) is not None:
+        if isinstance(future, BaseException):
+            raise future
+        yield future.result()
+
+
+def print_batch(networks, ns: argparse.Namespace) -> bool:
+    """
+    Prints a block for every (network, synthesized) of the batch, so the output lines up with the input
+    """
+    complete = True
+    for output_printer, synthesized in networks:
+        complete = complete and synthesized
+        print_network(output_printer, ns)
+        sys.stdout.flush()
+    return complete
+
+
+# modes that do not build the encoding of solve, which --dump-smt2 writes
+NO_DUMP_OPTIONS = ['batch', 'portfolio', 'sharded', 'bitvector', 'cegis', 'minimize', 'decompose']
+
+
+if __name__ == '__main__':
+    ns = cli_parser.parse_args()
+    if ns.dump_smt2 and (ns.engine == 'enumerate' or any(getattr(ns, key) for key in NO_DUMP_OPTIONS)):
+        cli_parser.error("--dump-smt2 only writes the encoding of the plain z3 mode, not with --engine enumerate "
+                         "or --" + ", --".join(key.replace('_', '-') for key in NO_DUMP_OPTIONS))
+
+    if ns.batch:
+        try:
+            if ns.file == '-':
+                complete = run_batch(sys.stdin, ns)
+            else:
+                with open(ns.file, "r") as file:
+                    complete = run_batch(file, ns)
+        except FileNotFoundError:
+            print(f"Fehler: Datei '{ns.file}' nicht gefunden.", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0 if complete else 1)
+
+    profiler = Profiler(ns.profile or ns.profile_json)
+
+    # YAML-Datei laden, ohne Angabe von stdin
+    try:
+        with profiler.phase('parse'):
+            if ns.file == '-':
+                spec = yaml.safe_load(sys.stdin)
+            else:
+                with open(ns.file, "r") as file:
+                    spec = yaml.safe_load(file)
+    except FileNotFoundError:
+        print(f"Fehler: Datei '{ns.file}' nicht gefunden.", file=sys.stderr)
+        sys.exit(1)
+    except yaml.YAMLError as e:
+        print(f"Fehler beim Laden der YAML-Datei: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    output_printer = synthesize(spec, ns=ns, profiler=profiler)
 
     # Set nodes like this:
     # output_printer.set_node(i, j, NetworkNode(op, in_0, in_1))
     # Set outputs like this:
     # output_printer.set_output(output_name, output_index)
-    
-else:
-    # Function is not realizable
-    output_printer.set_realizable(False)
+    with profiler.phase('print'):
+        print_network(output_printer, ns)
 
-output_printer.print()
+    if profiler.enabled:
+        profiler.report(ns.profile_json)
@@ -0,0 +1,290 @@
+"""Compact in-memory network, shared by printer.py, network2x.py, evaluator.py and validator.py.
+The nodes of all layers are stored in flat arrays of small ints: the op code and the operands, which index the previous
+layer, or the input names for the first layer. A Network converts to the dictionary NetworkPrinter prints as YAML,
+to JSON and a binary form, to dot, SMT and z3 expressions, and evaluates on NumPy arrays.
+The op tables and the division are defined here for all tools; the NumPy semantics are in evaluator.py and the
+z3 semantics in to_z3.
+"""
+
+import array
+import json
+import struct
+from typing import Dict
+
+# op codes are the indices into OPS
+OPS = ['+', '-', '*', '/', 'id', '<', '=', 'and', 'or', 'not']
+# ops that only use in_0
+UNARY_OPS = ['id', 'not']
+# ops whose operands can be swapped
+COMMUTATIVE_OPS = ['+', '*', '=', 'and', 'or']
+# the op codes of the encoding of fsynth.py (and of enumerator.py): OPS and a second 'id' that passes booleans on.
+# Ops 0-4 yield ints, ops 0-6 take int operands and ops 7-10 bool operands
+OP_SIGNS = OPS + ['id']
+UNARY_CODES = tuple(o for o, sign in enumerate(OP_SIGNS) if sign in UNARY_OPS)
+COMMUTATIVE_CODES = tuple(o for o, sign in enumerate(OP_SIGNS) if sign in COMMUTATIVE_OPS)
+# operand of the nodes without in_1
+NONE = -1
+
+# binary form: header, the input and output names (and the reason of an unknown network) separated by NUL, then the
+# arrays in native byte order
+MAGIC = b'FSN2'
+HEADER = '=4s??HHHI'
+
+
+def smt_div(a, b):
+    """
+    Integer division of SMT-LIB (the remainder is never negative), division by zero yields 0 like div0. Works on
+    ints and elementwise on NumPy arrays.
+    """
+    return ((b > 0) * 1 - (b < 0) * 1) * (a // (abs(b) + (b == 0)))
+
+
+class Network:
+    __slots__ = ('realizable', 'unknown', 'reason_unknown', 'inputs', 'outputs', 'emitted', 'offsets', 'ops', 'in_0',
+                 'in_1')
+
+    def __init__(self, realizable=True, inputs=(), outputs=(), emitted=(), offsets=(0,), ops=(), in_0=(), in_1=(),
+                 unknown=False, reason_unknown=None):
+        """
+        :param inputs: The names of the inputs the first layer refers to
+        :param outputs: The names of the outputs
+        :param emitted: The node of the last layer of every output
+        :param offsets: The index of the first node of every layer, and the number of nodes
+        :param unknown: Whether the solver gave up on the network, then realizable is False as well
+        :param reason_unknown: Why the solver gave up
+        """
+        self.realizable = realizable
+        self.unknown = unknown
+        self.reason_unknown = reason_unknown
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.emitted = array.array('h', emitted)
+        self.offsets = array.array('i', offsets)
+        self.ops = array.array('b', ops)
+        self.in_0 = array.array('h', in_0)
+        self.in_1 = array.array('h', in_1)
+
+    @classmethod
+    def from_layers(cls, layers, emitted: Dict[str, int]) -> 'Network':
+        """
+        :param layers: The nodes (op, in_0, in_1) of every layer, the first layer with input names as operands
+        :param emitted: Maps the output names to nodes of the last layer
+        """
+        network = cls(outputs=emitted, emitted=emitted.values())
+        for d, layer in enumerate(layers):
+            for op, in_0, in_1 in layer:
+                network.ops.append(OPS.index(op))
+                network.in_0.append(network.operand(in_0, d))
+                network.in_1.append(network.operand(in_1, d))
+            network.offsets.append(len(network.ops))
+        return network
+
+    @classmethod
+    def from_dict(cls, network: Dict) -> 'Network':
+        """
+        Reads the dictionary of NetworkPrinter.to_dict
+        """
+        if network.get('unknown', False):
+            return cls(realizable=False, unknown=True, reason_unknown=network.get('reason'))
+        if network.get('not_realizable', False):
+            return cls(realizable=False)
+        return cls.from_layers([[(node['op'], node['in_0'], node['in_1']) for node in layer]
+                                for layer in network['layers']], network['emitted'])
+
+    def operand(self, source, d: int) -> int:
+        if source is None:
+            return NONE
+        if d > 0:
+            return source
+        if source not in self.inputs:
+            self.inputs.append(source)
+        return self.inputs.index(source)
+
+    @property
+    def depth(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def width(self) -> int:
+        return max((b - a for a, b in zip(self.offsets, self.offsets[1:])), default=0)
+
+    def layer(self, d: int):
+        """
+        :return: The nodes (op, in_0, in_1) of layer d, with input names as operands in the first layer
+        """
+        def source(i):
+            return None if i == NONE else self.inputs[i] if d == 0 else i
+        return [(OPS[self.ops[k]], source(self.in_0[k]), source(self.in_1[k]))
+                for k in range(self.offsets[d], self.offsets[d + 1])]
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the dictionary NetworkPrinter prints
+        """
+        if self.unknown:
+            return {'unknown': True, 'reason': self.reason_unknown}
+        if not self.realizable:
+            return {'not_realizable': True}
+        return {'layers': [[{'op': op, 'in_0': in_0, 'in_1': in_1} for op, in_0, in_1 in self.layer(d)]
+                           for d in range(self.depth)],
+                'emitted': dict(zip(self.outputs, self.emitted)),
+                'not_realizable': False}
+
+    def to_json(self) -> str:
+        return json.dumps({'realizable': self.realizable, 'unknown': self.unknown,
+                           'reason_unknown': self.reason_unknown, 'inputs': self.inputs, 'outputs': self.outputs,
+                           'emitted': list(self.emitted), 'offsets': list(self.offsets), 'ops': list(self.ops),
+                           'in_0': list(self.in_0), 'in_1': list(self.in_1)}, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text: str) -> 'Network':
+        return cls(**json.loads(text))
+
+    def to_bytes(self) -> bytes:
+        names = '\0'.join(self.inputs + self.outputs + ([self.reason_unknown or ''] if self.unknown else [])).encode()
+        header = struct.pack(HEADER, MAGIC, self.realizable, self.unknown, len(self.inputs), len(self.outputs),
+                             self.depth, len(names))
+        return b''.join([header, names, self.emitted.tobytes(), self.offsets.tobytes(), self.ops.tobytes(),
+                         self.in_0.tobytes(), self.in_1.tobytes()])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Network':
+        magic, realizable, unknown, n_inputs, n_outputs, depth, n_names = struct.unpack_from(HEADER, data)
+        assert magic == MAGIC, "Tried to read a network but the data is not in its binary form"
+        position = struct.calcsize(HEADER)
+        names = data[position:position + n_names].decode().split('\0') if n_names else []
+        position += n_names
+
+        def take(typecode, count):
+            nonlocal position
+            values = array.array(typecode)
+            values.frombytes(data[position:position + count * values.itemsize])
+            position += count * values.itemsize
+            return values
+
+        emitted = take('h', n_outputs)
+        offsets = take('i', depth + 1)
+        ops, in_0, in_1 = take('b', offsets[-1]), take('h', offsets[-1]), take('h', offsets[-1])
+        reason = names[n_inputs + n_outputs] if unknown else None
+        return cls(realizable, names[:n_inputs], names[n_inputs:n_inputs + n_outputs], emitted, offsets, ops, in_0,
+                   in_1, unknown, reason)
+
+    def to_dot(self) -> str:
+        """
+        Returns the network in Graphviz format
+        """
+        lines = ["digraph G {", "graph [rankdir = LR, splines=ortho];"]
+        nodes = set()  # catch printed input nodes
+
+        def get_source(source, lidx):
+            if source is None:
+                return None
+            elif isinstance(source, int):
+                return f"node_{lidx - 1}_{source}"
+            n = f"node_{source}"
+            if n not in nodes:
+                lines.append(f"{n} [label=\"IN: {source}\",shape=circle,color=red,fontcolor=white,style=filled,"
+                             f"fillcolor=red]")
+                nodes.add(n)
+            return n
+
+        for lidx in range(self.depth):
+            for nidx, (op, in_0, in_1) in enumerate(self.layer(lidx)):
+                self_node = f"node_{lidx}_{nidx}"
+                lines.append(f"{self_node} [label=\"{op}\", shape=rectangle]")
+                prev_node_a = get_source(in_0, lidx)
+                prev_node_b = get_source(in_1, lidx)
+                if prev_node_a:
+                    lines.append(f"{prev_node_a}-> {self_node} [label=\"0\"]")
+                if prev_node_b:
+                    lines.append(f"{prev_node_b}-> {self_node} [label=\"1\"]")
+
+        lidx = self.depth - 1
+        for k, nidx in zip(self.outputs, self.emitted):
+            lines.append(f"node_{k} [label=\"Out: {k}\",shape=diamond,color=blue,fontcolor=white,style=filled,"
+                         f"fillcolor=blue]")
+            lines.append(f"node_{lidx}_{nidx} -> node_{k}")
+        lines.append("}")
+        return '\n'.join(lines)
+
+    def node_smt(self, op: str, a: str, b: str) -> str:
+        op = 'div0' if op == '/' else op
+        if op == 'id':
+            return a
+        if op in UNARY_OPS or b is None:
+            return f"({op} {a})"
+        return f"({op} {a} {b})"
+
+    def to_smt(self, share: bool = False) -> str:
+        """
+        Returns the SMT expression of the network: the conjunction of the equations of the outputs
+        :param share: Binds every node once with a let per layer instead of repeating its expression in every user,
+                      so the size grows linearly with the number of nodes instead of exponentially with the depth
+        """
+        if share:
+            text, prev = [], []
+            for lidx in range(self.depth):
+                names = [f"node_{lidx}_{nidx}" for nidx in range(self.offsets[lidx + 1] - self.offsets[lidx])]
+                source = (lambda x: x) if lidx == 0 else (lambda x: None if x is None else prev[x])
+                bindings = [f"({name} {self.node_smt(op, source(in_0), source(in_1))})"
+                            for name, (op, in_0, in_1) in zip(names, self.layer(lidx))]
+                text.append(f"(let ({' '.join(bindings)}) ")
+                prev = names
+            eq = [f"(= {k} {prev[nidx]})" for k, nidx in zip(self.outputs, self.emitted)]
+            return ''.join(text) + "(and " + ' '.join(eq) + ")" + ")" * self.depth
+
+        prev = []
+        for lidx in range(self.depth):
+            source = (lambda x: x) if lidx == 0 else (lambda x: None if x is None else prev[x])
+            prev = [self.node_smt(op, source(in_0), source(in_1)) for op, in_0, in_1 in self.layer(lidx)]
+        return "(and " + ' '.join(f"(= {k} {prev[nidx]})" for k, nidx in zip(self.outputs, self.emitted)) + ")"
+
+    def to_z3(self, variables):
+        """
+        Builds the network as z3 expression. Every node is built once and shared by its users, so the expression is
+        a DAG with one term per node.
+        :param variables: Maps the input and output names to z3 constants, Bool for boolean ones
+        :return: The conjunction of the equations of the outputs, like to_smt
+        """
+        import z3
+
+        def apply(op, a, b):
+            match op:
+                case '+': return a + b
+                case '-': return a - b
+                case '*': return a * b
+                case '/': return z3.If(b == 0, 0, a / b)
+                case '<': return a < b
+                case '=': return a == b
+                case 'and': return z3.And(a, b)
+                case 'or': return z3.Or(a, b)
+                case 'not': return z3.Not(a)
+                case _: return a
+
+        prev = None
+        for lidx in range(self.depth):
+            source = variables if lidx == 0 else prev
+            prev = [apply(op, source[in_0], source[in_0 if in_1 is None else in_1])
+                    for op, in_0, in_1 in self.layer(lidx)]
+        return z3.And([variables[k] == prev[nidx] for k, nidx in zip(self.outputs, self.emitted)])
+
+    def evaluate(self, inputs):
+        """
+        Evaluates the network on NumPy arrays of input values, see evaluator.evaluate
+        """
+        import evaluator
+        return evaluator.evaluate(self, inputs)
+
+    def failing_samples(self, spec: Dict):
+        """
+        :return: The indices of the samples whose outputs the network does not compute, see evaluator.failing_samples
+        """
+        import evaluator
+        return evaluator.failing_samples(self, spec)
+
+    def matches_samples(self, spec: Dict) -> bool:
+        """
+        Checks with the NumPy evaluator whether the network computes the outputs of every sample
+        """
+        import evaluator
+        return evaluator.matches_samples(self, spec)
@@ -6,6 +6,8 @@ import sys
 
 import yaml
 
+from network import Network, MAGIC
+
 
 def read_network(stream):
     re_start = re.compile(r"#\s*network")
@@ -39,88 +41,58 @@ cli_parser = argparse.ArgumentParser("network2x.py",
 
 cli_parser.add_argument("--to-dot", action="store_true", help="outputs Graphviz format of the network")
 cli_parser.add_argument("--to-smt", action="store_true", help="outputs SMTlib expression representing the network")
+cli_parser.add_argument("--share", action="store_true",
+                        help="with --to-smt binds every node once with let instead of repeating its expression")
+cli_parser.add_argument("--to-json", action="store_true", help="outputs the checked network as JSON of network.Network")
+
+cli_parser.add_argument("--max-width", action="store", type=int, help="if set checks the width of the network")
+cli_parser.add_argument("--max-depth", action="store", type=int, help="if set checks the depth of the network")
+
+cli_parser.add_argument("file", default="-", action="store",
+                        help="YAML, JSON or binary file of the network. Omitting: sys.stdin")
 
-cli_parser.add_argument("--max-width", action="store", help="if set checks the width of the network")
-cli_parser.add_argument("--max-depth", action="store", help="if set checks the depth of the network")
 
-cli_parser.add_argument("file", default="-", action="store", help="YAML file of the network. Omitting: sys.stdin")
+def as_network(network) -> Network:
+    return network if isinstance(network, Network) else Network.from_dict(network)
 
 
 def to_dot(network):
-    def get_source(source, lidx):
-        if source is None:
-            return None
-        elif isinstance(source, int):
-            return f"node_{lidx - 1}_{source}"
-        else:
-            n = f"node_{source}"
-            if n not in nodes:
-                print(f"{n} [label=\"IN: {source}\",shape=circle,color=red,fontcolor=white,style=filled,fillcolor=red]")
-                nodes.add(n)
-            return n
-
-    print("digraph G {")
-    print("graph [rankdir = LR, splines=ortho];")
-    nodes = set()  # catch printed input nodes
-
-    for lidx, layer in enumerate(network['layers']):
-        for nidx, node in enumerate(layer):
-            operation = node['op']
-            self_node = f"node_{lidx}_{nidx}"
-            print(f"node_{lidx}_{nidx} [label=\"{operation}\", shape=rectangle]")
-            prev_node_a = get_source(node['in_0'], lidx)
-            prev_node_b = get_source(node['in_1'], lidx)
-            if prev_node_a:
-                print(f"{prev_node_a}-> {self_node} [label=\"0\"]")
-            if prev_node_b:
-                print(f"{prev_node_b}-> {self_node} [label=\"1\"]")
-
-    lidx = len(network['layers']) - 1
-    for k, nidx in network['emitted'].items():
-        print(f"node_{k} [label=\"Out: {k}\",shape=diamond,color=blue,fontcolor=white,style=filled,fillcolor=blue]")
-        print(f"node_{lidx}_{nidx} -> node_{k}")
-
-    print("}")
+    print(as_network(network).to_dot())
 
 
 def to_smt(network):
-    exprs = dict()
-
-    def get_input(source, lidx):
-        if source is None:
-            return None
-        elif isinstance(source, int):
-            n = f"node_{lidx - 1}_{source}"
-            return exprs[n]
-        else:
-            return source
-
-    def smtop(op):
-        match op:
-            case '/':
-                return 'div0'
-            case _:
-                return op
-
-    for lidx, layer in enumerate(network['layers']):
-        for nidx, node in enumerate(layer):
-            self_node = f"node_{lidx}_{nidx}"
-            op = smtop(node['op'])
-            seq = (op,
-                   get_input(node['in_0'], lidx),
-                   get_input(node['in_1'], lidx))
-            seq = filter(lambda x: x is not None, seq)
-            if op == 'id': # skip identity
-                exprs[self_node] = list(seq)[1]
-            else:
-                exprs[self_node] = "(" + ' '.join(seq) + ")"
-    lidx = len(network['layers'])
-    eq = []
-    for k, nidx in network['emitted'].items():
-        self_node = get_input(nidx, lidx)
-        eq.append(f"(= {k} {self_node})")
-
-    print("(and " + ' '.join(eq) + ")")
+    print(as_network(network).to_smt())
+
+
+def to_smt_shared(network):
+    """
+    Like to_smt, but binds every node once with a let per layer, so the size of the expression grows linearly with
+    the number of nodes instead of exponentially with the depth
+    """
+    print(as_network(network).to_smt(share=True))
+
+
+def to_z3(network, variables):
+    """
+    Builds the network as z3 expression in-process, see Network.to_z3
+    """
+    return as_network(network).to_z3(variables)
+
+
+def load_network(data: bytes) -> Network:
+    """
+    Reads the network in any output format of fsynth.py: the binary form of Network, JSON or YAML between the
+    network markers (which is checked by check_inputs)
+    """
+    if data.startswith(MAGIC):
+        return Network.from_bytes(data)
+    text = data.decode()
+    if text.lstrip().startswith('{'):
+        return Network.from_json(text)
+    network = read_network(io.StringIO(text))
+    if not network.get('not_realizable', False) and not network.get('unknown', False):
+        check_inputs(network)
+    return Network.from_dict(network)
 
 
 def check_inputs(network):
@@ -152,30 +124,36 @@ if __name__ == '__main__':
     args = cli_parser.parse_args()
 
     if args.file is not None and args.file != '-':
-        with open(args.file) as fp:
-            network = read_network(fp)
+        with open(args.file, 'rb') as fp:
+            network = load_network(fp.read())
     else:
-        network = read_network(sys.stdin)
+        network = load_network(sys.stdin.buffer.read())
 
-    if network.get('not_realizable', False):
+    if network.unknown:
+        print("unknown")
+        sys.exit(0)
+
+    if not network.realizable:
         print("not realizable")
         sys.exit(0)
 
     if args.max_depth:
-        depth = len(network['layers'])
+        depth = network.depth
         if depth > args.max_depth:
             print(f"network2x: Given network is deeper {depth} than allowed {args.max_depth}")
             sys.exit(9)
 
     if args.max_width:
-        width = max(map(len, network['layers']))
+        width = network.width
         if width > args.max_width:
             print(f"network2x: Given network is wider {width} than allowed {args.max_width}")
             sys.exit(8)
 
-    check_inputs(network)
-
-    if args.to_smt:
+    if args.to_smt and args.share:
+        to_smt_shared(network)
+    elif args.to_smt:
         to_smt(network)
+    elif args.to_json:
+        print(network.to_json())
     else:
         to_dot(network)
@@ -3,6 +3,8 @@ from typing import Dict, List
 import yaml
 import sys
 
+from network import Network, UNARY_OPS
+
 """
 NetworkNode represents a single node in the network with a concrete operation and two inputs:
     op: The operation of the node (one of '+', '-', '*', '/', '=', '<', 'id', 'and', 'or', 'not')
@@ -25,6 +27,8 @@ class NetworkPrinter:
         self.depth = depth
         self.width = width
         self.realizable = None
+        self.unknown = False
+        self.reason_unknown = None
         self.nodes = [ [None]*self.width for _ in range(self.depth) ]
         self.outputs = { cur_out[0] : None for cur_out in outputs.items()}
 
@@ -35,6 +39,14 @@ class NetworkPrinter:
         """
         self.realizable = realizable
 
+    def set_unknown(self, reason : str):
+        """
+        Marks that the solver gave up, e.g. on a limit: the network is neither found nor shown not realizable
+        :param reason: Why the solver gave up
+        """
+        self.unknown = True
+        self.reason_unknown = reason
+
     def set_node(self, depth : int, width : int, node : NetworkNode):
         """
         Sets a node in the network
@@ -68,21 +80,96 @@ class NetworkPrinter:
         assert value < self.width, f"Tried to set output {output} but value {value} is not less than width"
         self.outputs[output] = value
 
-    def print(self):
+    def prune(self):
         """
-        Prints the network in the required output format
+        Drops the nodes no output depends on and the layers whose remaining nodes are all 'id', and renumbers the
+        nodes. The printed layers may then be fewer and narrower than depth and width.
+        """
+        if not self.realizable:
+            return
+
+        # the used nodes of every layer: the emitted ones and the operands of used nodes
+        used = [set() for _ in self.nodes]
+        used[-1].update(self.outputs.values())
+        for d in range(len(self.nodes) - 1, 0, -1):
+            for w in used[d]:
+                node = self.nodes[d][w]
+                used[d - 1].update([node.in_0] if node.op in UNARY_OPS or node.in_1 is None else [node.in_0, node.in_1])
+        index = [{w: i for i, w in enumerate(sorted(ws))} for ws in used]
+
+        layers = []
+        for d, layer in enumerate(self.nodes):
+            def renumber(source):
+                return source if d == 0 or source is None else index[d - 1][source]
+            nodes = []
+            for w in sorted(used[d]):
+                node = layer[w]
+                in_0 = renumber(node.in_0)
+                in_1 = in_0 if node.op in UNARY_OPS and node.in_1 is not None else renumber(node.in_1)
+                nodes.append(NetworkNode(node.op, in_0, in_1))
+            layers.append(nodes)
+        outputs = {name: index[-1][w] for name, w in self.outputs.items()}
+
+        # a layer of id nodes passes its operands on, its users can take them directly
+        for d in reversed(range(len(layers))):
+            if len(layers) == 1 or any(node.op != 'id' for node in layers[d]):
+                continue
+            if d == len(layers) - 1:
+                outputs = {name: layers[d][w].in_0 for name, w in outputs.items()}
+            else:
+                layers[d + 1] = [NetworkNode(node.op, layers[d][node.in_0].in_0,
+                                             None if node.in_1 is None else layers[d][node.in_1].in_0)
+                                 for node in layers[d + 1]]
+            del layers[d]
+
+        self.depth = len(layers)
+        self.nodes = [layer + [None] * (self.width - len(layer)) for layer in layers]
+        self.outputs = outputs
+
+    def to_dict(self) -> Dict:
         """
+        Returns the network as the dictionary that is printed
+        """
+        if self.unknown:
+            return {'unknown': True, 'reason': self.reason_unknown}
         assert self.realizable is not None, "Tried to print but realizable is not set"
         if self.realizable:
             # Unwrap named tuples
             output_layers = [list(filter(lambda x: x != None,map(lambda n: {"op": n.op, "in_0": n.in_0, "in_1": n.in_1} if n is not None else None, layer))) for layer in self.nodes]
-            result = {
+            return {
                 "layers": output_layers,
                 "emitted" : self.outputs,
                 'not_realizable': False
             }
         else:
-            result = { 'not_realizable': True }
+            return { 'not_realizable': True }
+
+    def to_network(self) -> Network:
+        """
+        Returns the network as compact Network
+        """
+        if self.unknown:
+            return Network(realizable=False, unknown=True, reason_unknown=self.reason_unknown)
+        assert self.realizable is not None, "Tried to print but realizable is not set"
+        if not self.realizable:
+            return Network(realizable=False)
+        return Network.from_layers([[node for node in layer if node is not None] for layer in self.nodes],
+                                   self.outputs)
+
+    def print(self, format: str = 'yaml'):
+        """
+        Prints the network in the required output format
+        :param format: 'yaml' (required), or 'json' and 'binary' of Network, which network2x.py reads as well
+        """
+        if format == 'json':
+            print(self.to_network().to_json())
+            return
+        if format == 'binary':
+            sys.stdout.flush()
+            sys.stdout.buffer.write(self.to_network().to_bytes())
+            return
+
+        result = self.to_dict()
 
         print("# network")
         yaml.dump(result, sys.stdout)
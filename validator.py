@@ -2,24 +2,42 @@
 
 import argparse
 import io
+import multiprocessing
+import os
+import resource
+import signal
 import subprocess
 import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from statistics import mean, stdev, median
 import z3
 
 import yaml
 
+from network import Network
+
 # STATISTICS
 ERRORS = 0
 SUCCESS = 0
 FAILURE = 0
+TIMEOUT = 0
+UNKNOWN = 0
 TIMINGS = []
+CPU_TIMINGS = []
 
 
-def validate(filename: Path, ns: argparse.Namespace):
-    global ERRORS, SUCCESS, FAILURE, TIMINGS
+def child_cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
 
+def validate(filename: Path, ns: argparse.Namespace):
+    """
+    Runs the pipeline on one problem file and checks its solution
+    :return: The status (one of 'ERRORS', 'SUCCESS', 'FAILURE', 'TIMEOUT', 'UNKNOWN'), the wall time and the CPU time of the
+             pipeline in seconds
+    """
     with filename.open() as fp:
         spec = yaml.safe_load(fp)
         depth = spec['depth']
@@ -32,75 +50,211 @@ def validate(filename: Path, ns: argparse.Namespace):
 
     n2x = (Path(__file__).parent / "network2x.py").absolute()
 
-    cli = f"cat {filename.absolute()} | {pre_filter} | {fsynth_prefix} python3 {fsynth} " \
-          f"| python3 {n2x} --to-smt --max-width {width} --max-depth {depth} -"
+    cli = f"cat {filename.absolute()} | {pre_filter} | {fsynth_prefix} python3 {fsynth} {fsynth_options(ns)} " \
+          f"| python3 {n2x} {'--to-smt --share' if ns.proof else '--to-json'} --max-width {width} --max-depth {depth} -"
     print("Execute: ", cli)
-    start = time.process_time()
-    status, out = subprocess.getstatusoutput(cli)
-    stop = time.process_time()
-
-    if status != 0:
-        print("Terminated with status code: ", status)
+    start, start_cpu = time.perf_counter(), child_cpu_time()
+    # own session, so a timeout kills the whole pipeline
+    process = subprocess.Popen(cli, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                               start_new_session=True)
+    try:
+        out, _ = process.communicate(timeout=ns.timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        print(f"{filename}: Timeout after {ns.timeout} s")
+        return 'TIMEOUT', time.perf_counter() - start, child_cpu_time() - start_cpu
+    wall, cpu = time.perf_counter() - start, child_cpu_time() - start_cpu
+    out = out.rstrip("\n")
+
+    if process.returncode != 0:
+        print(f"{filename}: Terminated with status code: ", process.returncode)
         print("Output:", out)
-        ERRORS = ERRORS + 1
-        return
-
-    print("Took: ", stop - start, "ms")
-    TIMINGS.append(stop - start)
+        return 'ERRORS', wall, cpu
 
+    print(f"{filename}: Took: {wall} s wall, {cpu} s cpu")
     print("Solution: ", out)
-    check(spec, out)
+    if out.strip() == UNKNOWN_RESULT:
+        return 'UNKNOWN', wall, cpu
+    return ('SUCCESS' if check(spec, out, proof=ns.proof) else 'FAILURE'), wall, cpu
+
+
+def fsynth_options(ns: argparse.Namespace) -> str:
+    """
+    Command line options of fsynth.py: without --cache every problem is synthesized anew, so the timings and
+    results are not those of the result cache
+    """
+    return "" if ns.cache else "--no-cache"
+
+
+def synthesize_process(spec, options, conn):
+    import fsynth
+    conn.send(fsynth.synthesize(spec, ns=options).to_network())
+
+
+def validate_in_process(filename: Path, ns: argparse.Namespace):
+    """
+    Synthesizes the network of one problem with fsynth.synthesize in this process and checks the network object,
+    without shell pipeline and SMT text. With a timeout the synthesis runs in a forked process that can be killed.
+    :return: Like validate
+    """
+    import fsynth
+
+    with filename.open() as fp:
+        spec = yaml.safe_load(fp)
+
+    options = fsynth.cli_parser.parse_args(fsynth_options(ns).split())
+    print("Synthesize: ", filename)
+    start, start_cpu = time.perf_counter(), time.process_time() + child_cpu_time()
+    if ns.timeout is None:
+        network = fsynth.synthesize(spec, ns=options).to_network()
+    else:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=synthesize_process, args=(spec, options, sender))
+        process.start()
+        sender.close()
+        if not receiver.poll(ns.timeout):
+            process.kill()
+            process.join()
+            print(f"{filename}: Timeout after {ns.timeout} s")
+            return 'TIMEOUT', time.perf_counter() - start, time.process_time() + child_cpu_time() - start_cpu
+        try:
+            network = receiver.recv()
+        except EOFError:
+            network = None
+        process.join()
+    wall, cpu = time.perf_counter() - start, time.process_time() + child_cpu_time() - start_cpu
+
+    if network is None:
+        print(f"{filename}: Synthesis terminated with status code: ", process.exitcode)
+        return 'ERRORS', wall, cpu
+
+    print(f"{filename}: Took: {wall} s wall, {cpu} s cpu")
+    if network.unknown:
+        print("Solution: ", UNKNOWN_RESULT, f"({network.reason_unknown})")
+        return 'UNKNOWN', wall, cpu
+    return ('SUCCESS' if check_network(spec, network, ns.proof) else 'FAILURE'), wall, cpu
+
+
+def record(status: str, wall: float, cpu: float):
+    global ERRORS, SUCCESS, FAILURE, TIMEOUT, UNKNOWN
+    if status == 'ERRORS':
+        ERRORS += 1
+    elif status == 'SUCCESS':
+        SUCCESS += 1
+    elif status == 'FAILURE':
+        FAILURE += 1
+    elif status == 'UNKNOWN':
+        UNKNOWN += 1
+    else:
+        TIMEOUT += 1
+    if status in ('SUCCESS', 'FAILURE'):
+        TIMINGS.append(wall)
+        CPU_TIMINGS.append(cpu)
 
 
 NOT_REALIZABLE = "not realizable"
+# output of network2x if the solver gave up, e.g. on fsynth --timeout
+UNKNOWN_RESULT = "unknown"
 
 
-def check(spec, last_line, use_result=False):
-    global SUCCESS, FAILURE
+def check(spec, last_line, use_result=False, proof=True) -> bool:
+    """
+    :param last_line: The network as SMT expression, or as JSON of Network if not proof
+    :param proof: Checks the samples with z3, otherwise with the NumPy evaluator
+    :return: Whether the solution is correct
+    """
     last_line = last_line.strip()
 
-    result: str = spec["result"]
+    # the result is optional, without it a network is checked on the samples
+    result: str = spec.get("result")
 
     if result == NOT_REALIZABLE:
-        if last_line == NOT_REALIZABLE:
-            SUCCESS += 1
-        else:
-            FAILURE += 1
-        return
+        return last_line == NOT_REALIZABLE
     elif last_line == NOT_REALIZABLE:
-        FAILURE += 1
-        return
+        return unchecked_not_realizable(result)
 
-    if use_result:
-        check_by_result(result, last_line, spec)
+    if use_result and result is not None:
+        return check_by_result(result, last_line, spec)
+    elif proof:
+        return check_by_samples(last_line, spec)
     else:
-        check_by_samples(last_line, spec)
-
-
-def check_by_samples(last_line: str, spec):
-    global SUCCESS, FAILURE
-    samples = spec["samples"]
-
+        return Network.from_json(last_line).matches_samples(spec)
+
+
+def unchecked_not_realizable(result) -> bool:
+    """
+    A not realizable solution is only wrong if the specification has a result, the samples cannot refute it
+    """
+    if result is None:
+        print("Not realizable is not checked: the specification has no result")
+    return result is None
+
+
+def check_network(spec, network, proof=False) -> bool:
+    """
+    Checks a Network against the samples of the specification
+    :param proof: Checks the samples with z3, otherwise with the NumPy evaluator
+    :return: Whether the network is correct
+    """
+    result: str = spec.get("result")
+    if result == NOT_REALIZABLE or not network.realizable:
+        print("Solution: ", NOT_REALIZABLE if not network.realizable else "realizable")
+        if result == NOT_REALIZABLE:
+            return not network.realizable
+        return unchecked_not_realizable(result)
+
+    if not proof:
+        return network.matches_samples(spec)
+    inputs, all = spec_variables(spec)
+    return check_formula(network.to_z3(all), inputs, all, spec["samples"])
+
+
+def spec_variables(spec):
+    """
+    :return: The z3 constants of the inputs and of all variables of the specification
+    """
     def make_var(x, t):
         if t == "int":
             return z3.Int(x)
         elif t == "bool":
             return z3.Bool(x)
 
-    def py_value(x):
-        if x.is_int():
-            return int(str(x))
-        elif x.is_bool():
-            return "true" == str(x)
-
     inputs = {x: make_var(x, t) for x, t in spec["inputs"].items()}
     outputs = {x: make_var(x, t) for x, t in spec["outputs"].items()}
     all = {}
     all.update(inputs)
     all.update(outputs)
+    return inputs, all
+
+
+def define_div0(eq):
+    """
+    Gives the div0 of network2x the semantics of the network, division by zero yields 0. z3 parses div0 as its
+    builtin symbol, which leaves division by zero unspecified and cannot be redefined.
+    """
+    div0 = z3.parse_smt2_string("(assert (= (div0 0 0) 0))")[0].arg(0).decl()
+    a, b = z3.Var(0, z3.IntSort()), z3.Var(1, z3.IntSort())
+    return z3.substitute_funs(z3.And(eq), (div0, z3.If(b == 0, 0, a / b)))
+
+
+def check_by_samples(last_line: str, spec) -> bool:
+    inputs, all = spec_variables(spec)
+    eq = define_div0(z3.parse_smt2_string(f"(assert {last_line})", sorts={}, decls=all))
+    return check_formula(eq, inputs, all, spec["samples"])
+
+
+def check_formula(eq, inputs, all, samples) -> bool:
+    """
+    Checks that the formula of the network gives the outputs of every sample
+    """
+    def py_value(x):
+        if z3.is_int_value(x):
+            return x.as_long()
+        elif z3.is_bool(x):
+            return z3.is_true(x)
 
     s = z3.Solver()
-    eq = z3.parse_smt2_string(f"(assert {last_line})", sorts={}, decls=all)
     s.add(eq)
 
     for sample in samples:
@@ -112,36 +266,32 @@ def check_by_samples(last_line: str, spec):
             error = [actual[k] != v for k, v in sample.items()]
             # print(f"Tested against {len(error)} samples: {error}")
             if any(error):
-                FAILURE += 1
-                return
+                return False
         else:
             print("Applied sample with inputs:", assum, f" but receive {ans}!")
-            FAILURE += 1
-            return
-    SUCCESS += 1
-
+            return False
+    return True
 
-def check_by_result(result: str, last_line: str, spec):
-    global SUCCESS, FAILURE
 
+def check_by_result(result: str, last_line: str, spec) -> bool:
     smt = io.StringIO()
     for x, t in list(spec["inputs"].items()) + list(spec["outputs"].items()):
         type = t.capitalize()
         smt.write(f"(declare-const {x} {type})\n")
-        smt.write(f"(assert (not (= {result} {last_line})))")
+    smt.write(f"(assert (not (= {result} {last_line})))")
 
-        # SMT test
-        # print(smt.getvalue())
+    # SMT test
+    # print(smt.getvalue())
 
     s = z3.Solver()
-    s.from_string(smt.getvalue())
+    s.add(define_div0(z3.parse_smt2_string(smt.getvalue())))
     ans = s.check()
     print("Result: ", ans)
     if ans == z3.unsat:
-        SUCCESS += 1
+        return True
     else:
         print("Model:", s.model())
-        FAILURE += 1
+        return False
 
 
 if __name__ == "__main__":
@@ -177,18 +327,45 @@ if __name__ == "__main__":
         help="Use the result field for validation check, otherwise just use the samples.",
     )
     cli_parser.add_argument(
-        "files", action="append", help="YAML files", metavar="FILENAME"
+        "--proof", action="store_true",
+        help="check the samples with z3 instead of evaluating the network with NumPy",
+    )
+    cli_parser.add_argument(
+        "--in-process", action="store_true",
+        help="synthesize with fsynth.synthesize in this process instead of the fsynth pipeline",
+    )
+    cli_parser.add_argument(
+        "--cache", action="store_true",
+        help="use the result cache of fsynth.py, by default every problem is synthesized anew",
+    )
+    cli_parser.add_argument(
+        "-j", "--jobs", help="number of problems validated in parallel", metavar="N", type=int, default=1
+    )
+    cli_parser.add_argument(
+        "--timeout", help="seconds after which the pipeline of a problem is killed", metavar="SECONDS", type=float
+    )
+    cli_parser.add_argument(
+        "files", nargs="+", help="YAML files", metavar="FILENAME"
     )
 
     ns = cli_parser.parse_args()
 
-    for fil in ns.files:
-        validate(Path(fil), ns)
+    run = validate_in_process if ns.in_process else validate
+    if ns.jobs > 1:
+        with ProcessPoolExecutor(ns.jobs) as pool:
+            results = list(pool.map(run, map(Path, ns.files), [ns] * len(ns.files)))
+    else:
+        results = [run(Path(fil), ns) for fil in ns.files]
+    for result in results:
+        record(*result)
 
     print("Statistics:")
     print("ERRORS:", ERRORS)
     print("SUCCESS:", SUCCESS)
     print("FAILURE:", FAILURE)
+    print("TIMEOUT:", TIMEOUT)
+    print("UNKNOWN:", UNKNOWN)
     if len(TIMINGS) > 1:
         print(f"Timings: mean={mean(TIMINGS)} std={stdev(TIMINGS)} median={median(TIMINGS)}")
+        print(f"CPU timings: mean={mean(CPU_TIMINGS)} std={stdev(CPU_TIMINGS)} median={median(CPU_TIMINGS)}")
 